@@ -0,0 +1,67 @@
+"""
+Run the benchmarks: python -m benchmarks [-k FILTER] [--save] [--quick]
+"""
+import argparse
+import importlib
+import os
+import sys
+
+from benchmarks.harness import (
+    BENCHMARKS,
+    load_baseline,
+    regressions,
+    run_benchmark,
+    save_baseline,
+)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    parser.add_argument('-k', '--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline.json'))
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.25,
+        help='fraction slower / larger than the baseline that counts as a regression'
+    )
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size (best is kept)')
+    parser.add_argument('--quick', action='store_true', help='only the two smallest sizes')
+    args = parser.parse_args(argv)
+
+    for filename in sorted(os.listdir(HERE)):
+        if filename.startswith('bench_') and filename.endswith('.py'):
+            importlib.import_module(f'benchmarks.{filename[:-3]}')
+
+    results = {}
+    print(f'{"benchmark":<36} {"size":>6} {"time (ms)":>11} {"peak (KiB)":>11}')
+    for name in sorted(BENCHMARKS):
+        if args.filter not in name:
+            continue
+        results[name] = result = run_benchmark(name, args.repeat, args.quick)
+        for size, measured in result['sizes'].items():
+            print(
+                f'{name:<36} {size:>6} {measured["seconds"] * 1000:>11.3f} '
+                f'{measured["peak_bytes"] / 1024:>11.1f}'
+            )
+        if result['exponent'] is not None:
+            print(f'{"":<36} scaling ~ n^{result["exponent"]:.2f}')
+
+    found = regressions(results, load_baseline(args.baseline), args.threshold)
+    for regression in found:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+
+    if args.save:
+        baseline = load_baseline(args.baseline)
+        baseline.update(results)
+        save_baseline(args.baseline, baseline)
+        print(f'saved baseline to {args.baseline}')
+
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
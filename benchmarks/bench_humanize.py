@@ -0,0 +1,30 @@
+import random
+
+from benchmarks.harness import benchmark
+from midigen import humanize
+from midigen.time import Measure
+
+
+def _measure(notes_per_bar: int):
+    return Measure.from_pattern([[60 + i % 12] for i in range(notes_per_bar)])
+
+
+def _mutate(mutator, amount):
+    def setup(notes_per_bar: int):
+        measures = [_measure(notes_per_bar) for _ in range(16)]
+
+        def run():
+            random.seed(0)
+            for measure in measures:
+                mutator(measure, amount)
+        return run
+    setup.__name__ = mutator.__name__
+    setup.__module__ = __name__
+    return benchmark(sizes=[4, 16, 64, 256], max_exponent=1.3)(setup)
+
+
+swing = _mutate(humanize.swing, 0.1)
+randomize_time = _mutate(humanize.randomize_time, 0.01)
+randomize_velocity = _mutate(humanize.randomize_velocity, 0.01)
+pulse = _mutate(humanize.pulse, 0.1)
+dropout = _mutate(humanize.dropout, 0.1)
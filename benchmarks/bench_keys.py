@@ -0,0 +1,29 @@
+from benchmarks.harness import benchmark
+from midigen.keys import Key, voice_progression, _match_voicing, _closest_voicing, _movement
+
+_EXTENSIONS = {3: [], 4: [7], 5: [7, 9], 6: [7, 9, 11], 7: [7, 9, 11, 13]}
+_PROGRESSION = ['ii', 'V', 'I', 'vi', 'IV', 'iii', 'vii', 'I']
+
+
+@benchmark(sizes=[3, 4, 5, 6, 7])
+def match_voicing(chord_size: int):
+    keys = [Key.parse(chord)[0] for chord in _PROGRESSION]
+    voicing = keys[2].triad()
+
+    def run():
+        # uncached: measure the search itself
+        _match_voicing.cache_clear()
+        for key in keys:
+            key.chord(_EXTENSIONS[chord_size], match_voicing=voicing)
+    return run
+
+
+@benchmark(sizes=[16, 64, 256, 512], max_exponent=1.3)
+def voice_progression_13ths(chords: int):
+    keys = [Key.parse(_PROGRESSION[i % len(_PROGRESSION)])[0] for i in range(chords)]
+
+    def run():
+        _closest_voicing.cache_clear()
+        _movement.cache_clear()
+        voice_progression(keys, [_EXTENSIONS[7]] * chords)
+    return run
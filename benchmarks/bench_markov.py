@@ -0,0 +1,37 @@
+import random
+
+from benchmarks.harness import benchmark
+from midigen.markov import Graph
+from midigen.notes import Note
+
+
+def _range(octaves: int):
+    return Note.C.value_for_octave(0), Note.C.value_for_octave(0) + 12 * octaves
+
+
+@benchmark(sizes=[1, 2, 3, 4, 6])
+def build(octaves: int):
+    min_note, max_note = _range(octaves)
+
+    def run():
+        Graph(min_note=min_note, max_note=max_note)
+    return run
+
+
+@benchmark(sizes=[1, 2, 3, 4, 6])
+def build_bounded(octaves: int):
+    min_note, max_note = _range(octaves)
+
+    def run():
+        Graph(min_note=min_note, max_note=max_note, max_interval=7)
+    return run
+
+
+@benchmark(sizes=[64, 256, 1024, 4096], max_exponent=1.3)
+def walk(length: int):
+    graph = Graph(min_note=Note.C.value_for_octave(2), max_note=Note.C.value_for_octave(4)).compile()
+
+    def run():
+        random.seed(0)
+        graph.generate_sequence(length)
+    return run
@@ -0,0 +1,66 @@
+import io
+
+from benchmarks.harness import benchmark
+from midigen import rhythm
+from midigen.sequencer import Song, Track
+
+
+@benchmark(sizes=[16, 64, 256, 1024], max_exponent=1.3)
+def from_measures(bars: int):
+    measures = [rhythm.straight_16ths() for _ in range(bars)]
+
+    def run():
+        Track.from_measures(measures).materialize()
+    return run
+
+
+@benchmark(sizes=[16, 64, 256, 1024], max_exponent=1.3)
+def append(bars: int):
+    bar = Track.from_measures([rhythm.straight_16ths()])
+
+    def run():
+        track = bar
+        for _ in range(bars - 1):
+            track = track.append(bar)
+        track.materialize()
+    return run
+
+
+@benchmark(sizes=[16, 64, 256], max_exponent=1.3)
+def to_midi(bars: int):
+    song = Song([
+        Track.from_measures([pattern() for _ in range(bars)], channel=channel)
+        for channel, pattern in enumerate((
+            rhythm.four_on_the_floor,
+            rhythm.son_clave,
+            rhythm.straight_8ths,
+            rhythm.straight_16ths,
+        ))
+    ])
+
+    def run():
+        song.to_midi('bench', file=io.BytesIO())
+    return run
+
+
+@benchmark(sizes=[1, 2, 4, 8, 16], max_exponent=1.3)
+def to_midi_tracks(tracks: int):
+    song = Song([
+        Track.from_measures([rhythm.straight_16ths() for _ in range(32)], channel=channel)
+        for channel in range(tracks)
+    ])
+
+    def run():
+        song.to_midi('bench', file=io.BytesIO())
+    return run
+
+
+@benchmark(sizes=[16, 64, 256, 1024], max_exponent=1.3)
+def pattern_bars(bars: int):
+    def run():
+        Track.from_measures([
+            measure
+            for _ in range(bars)
+            for measure in (rhythm.four_on_the_floor(), rhythm.son_clave(), rhythm.straight_16ths())
+        ])
+    return run
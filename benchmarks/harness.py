@@ -0,0 +1,127 @@
+"""
+Minimal benchmark harness: benchmarks register a setup function per input
+size, and are timed (best of a few runs) and measured for peak memory
+(tracemalloc) across all their sizes, so the fitted scaling exponent shows
+how each hot path grows.
+"""
+import gc
+import json
+import math
+import time
+import tracemalloc
+from typing import Callable, List
+
+BENCHMARKS = {}
+
+
+def benchmark(sizes: List[int], max_exponent: float = None):
+    """
+    Register `setup(size) -> run` as a benchmark; only `run()` is measured.
+    With max_exponent, a fitted scaling exponent above it is a regression.
+    """
+    def register(setup: Callable):
+        name = f'{setup.__module__.split(".")[-1][len("bench_"):]}.{setup.__name__}'
+        BENCHMARKS[name] = (setup, sizes, max_exponent)
+        return setup
+    return register
+
+
+def measure(setup: Callable, size: int, repeat: int = 3):
+    """
+    (best wall time in seconds, peak traced memory in bytes) of run()
+    """
+    times = []
+    for _ in range(repeat):
+        run = setup(size)
+        gc.collect()
+        tstart = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - tstart)
+
+    # memory is traced in a separate run, tracemalloc slows everything down
+    run = setup(size)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def scaling_exponent(sizes: List[int], times: List[float]):
+    """
+    Least squares slope of log(time) against log(size): ~1 for linear,
+    ~2 for quadratic
+    """
+    points = [
+        (math.log(size), math.log(t))
+        for size, t in zip(sizes, times)
+        if size > 0 and t > 0
+    ]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def run_benchmark(name: str, repeat: int = 3, quick: bool = False):
+    setup, sizes, max_exponent = BENCHMARKS[name]
+    if quick:
+        sizes = sizes[:2]
+    results = {}
+    for size in sizes:
+        seconds, peak = measure(setup, size, repeat)
+        results[str(size)] = {'seconds': seconds, 'peak_bytes': peak}
+    return {
+        'sizes': results,
+        'exponent': scaling_exponent(
+            sizes,
+            [results[str(size)]['seconds'] for size in sizes]
+        ),
+        'max_exponent': max_exponent,
+    }
+
+
+def regressions(results: dict, baseline: dict, threshold: float = 0.25):
+    """
+    Descriptions of every measurement more than `threshold` (a fraction)
+    slower or larger than the baseline, and every scaling exponent above
+    its benchmark's max_exponent
+    """
+    found = []
+    for name, result in results.items():
+        exponent, max_exponent = result['exponent'], result['max_exponent']
+        if exponent is not None and max_exponent is not None and exponent > max_exponent:
+            found.append(f'{name}: scales as n^{exponent:.2f} (expected <= n^{max_exponent})')
+
+        for size, measured in result['sizes'].items():
+            base = baseline.get(name, {}).get('sizes', {}).get(size)
+            if not base:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if base[metric] and measured[metric] > base[metric] * (1 + threshold):
+                    found.append(
+                        f'{name}[{size}]: {metric} {measured[metric]:.4g} '
+                        f'vs baseline {base[metric]:.4g} '
+                        f'(+{measured[metric] / base[metric] - 1:.0%})'
+                    )
+    return found
+
+
+def load_baseline(filename: str):
+    try:
+        with open(filename) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(filename: str, results: dict):
+    with open(filename, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
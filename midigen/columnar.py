@@ -0,0 +1,419 @@
+"""
+Columnar, numpy backed tracks and measures for long renders; events are
+stored as parallel arrays and only converted to events when written to a
+file or sent to a port.
+
+Requires numpy: pip install midigen[columnar]
+"""
+from math import pi
+from typing import List
+
+import numpy as np
+
+from midigen.events import Event
+from midigen.sequencer import Track
+from midigen.time import Measure, TimeSignature, TICKS_PER_BEAT
+
+
+MESSAGE_TYPES = ['note_off', 'note_on']
+_TYPE_CODES = {t: i for i, t in enumerate(MESSAGE_TYPES)}
+
+COLUMNS = {
+    'tick': np.int64,
+    'type': np.uint8,
+    'note': np.int16,
+    'velocity': np.int16,
+    'channel': np.uint8,
+}
+
+
+def _empty_columns():
+    return {
+        name: np.zeros(0, dtype=dtype)
+        for name, dtype in COLUMNS.items()
+    }
+
+
+def _columns_from_messages(messages: List[Event], offset: int = 0):
+    rows = {name: [] for name in COLUMNS}
+    for msg in messages:
+        if msg.type not in _TYPE_CODES:
+            raise ValueError(f'columnar tracks only hold note messages, not {msg.type}')
+        rows['tick'].append(msg.time + offset)
+        rows['type'].append(_TYPE_CODES[msg.type])
+        rows['note'].append(msg.note)
+        rows['velocity'].append(msg.velocity)
+        rows['channel'].append(msg.channel)
+
+    return {
+        name: np.array(values, dtype=COLUMNS[name])
+        for name, values in rows.items()
+    }
+
+
+def _messages_from_columns(columns: dict):
+    order = np.argsort(columns['tick'], kind='stable')
+    tick, type_, note, velocity, channel = (
+        columns[name][order].tolist()
+        for name in COLUMNS
+    )
+    return [
+        Event(MESSAGE_TYPES[t], note=n, velocity=v, channel=c, time=tk)
+        for tk, t, n, v, c in zip(tick, type_, note, velocity, channel)
+    ]
+
+
+def _measure_columns(measure: Measure, offset: int = 0):
+    if isinstance(measure, ColumnarMeasure):
+        order = np.argsort(measure.columns['tick'], kind='stable')
+        columns = {name: values[order] for name, values in measure.columns.items()}
+        columns['tick'] = columns['tick'] + offset
+        return columns
+    return _columns_from_messages(sorted(measure.messages, key=lambda m: m.time), offset)
+
+
+def _concat(columns: List[dict]):
+    if not columns:
+        return _empty_columns()
+    return {
+        name: np.concatenate([c[name] for c in columns])
+        for name in COLUMNS
+    }
+
+
+class ColumnarTrack(Track):
+    """
+    Drop-in replacement for Track whose events live in numpy arrays;
+    shift_time, shift_pitch, stack, append and loop are vectorized
+    """
+    def __init__(
+        self,
+        name: str = 'midigen',
+        duration_ticks: int = 0,
+        columns: dict = None,
+        channel: int = 0,
+        program: int = 0
+    ):
+        self.name = name
+        self.duration_ticks = duration_ticks
+        self.columns = columns if columns is not None else _empty_columns()
+        self.channel = channel
+        self.program = program
+
+    def __len__(self):
+        return len(self.columns['tick'])
+
+    @staticmethod
+    def from_track(track: Track):
+        if isinstance(track, ColumnarTrack):
+            return track
+        return ColumnarTrack(
+            track.name,
+            track.duration_ticks,
+            _columns_from_messages(track.messages),
+            track.channel,
+            track.program
+        )
+
+    @staticmethod
+    def from_measures(
+        measures: List[Measure],
+        channel: int = 0,
+        program: int = 0,
+        name: str = 'midigen',
+        stack: bool = False
+    ):
+        columns = []
+        duration_ticks = 0
+        for measure in measures:
+            if stack:
+                columns.append(_measure_columns(measure))
+                duration_ticks = max(duration_ticks, measure.duration_ticks)
+            else:
+                columns.append(_measure_columns(measure, duration_ticks))
+                duration_ticks += measure.duration_ticks
+
+        return ColumnarTrack(name, duration_ticks, _concat(columns), channel, program)
+
+    @property
+    def messages(self):
+        return _messages_from_columns(self.columns)
+
+    @messages.setter
+    def messages(self, messages: List[Event]):
+        self.columns = _columns_from_messages(sorted(messages, key=lambda m: m.time))
+
+    @property
+    def _pieces(self):
+        # lets plain Tracks append / stack columnar ones
+        return ((0, self.messages),)
+
+    def materialize(self):
+        return self
+
+    def iter_messages(self):
+        return iter(self.messages)
+
+    def mutate(self, mutator: callable):
+        return mutator(self)
+
+    def to_track(self):
+        return Track(
+            self.name,
+            self.duration_ticks,
+            self.messages,
+            self.channel,
+            self.program
+        )
+
+    def _with(self, duration_ticks: int = None, **columns):
+        return ColumnarTrack(
+            self.name,
+            self.duration_ticks if duration_ticks is None else duration_ticks,
+            {**self.columns, **columns},
+            self.channel,
+            self.program
+        )
+
+    def shift_time(self, offs_ticks: int):
+        return self._with(tick=self.columns['tick'] + offs_ticks)
+
+    def shift_pitch(self, offs: int):
+        note = self.columns['note'] + offs
+        if len(note) and (note.min() < 0 or note.max() > 127):
+            raise ValueError('note must be in range 0..127')
+        return self._with(note=note)
+
+    def append(self, other: Track):
+        return ColumnarTrack.string_tracks([self, other])
+
+    def stack(self, other: Track):
+        other = ColumnarTrack.from_track(other)
+        return self._with(
+            max(self.duration_ticks, other.duration_ticks),
+            **_concat([self.columns, other.columns])
+        )
+
+    def loop(self, n: int):
+        offsets = np.repeat(
+            np.arange(n, dtype=np.int64) * self.duration_ticks,
+            len(self)
+        )
+        columns = {
+            name: np.tile(values, n)
+            for name, values in self.columns.items()
+        }
+        columns['tick'] += offsets
+        return self._with(self.duration_ticks * n, **columns)
+
+    @staticmethod
+    def string_tracks(tracks: List[Track]):
+        tracks = [ColumnarTrack.from_track(t) for t in tracks]
+        duration_ticks = 0
+        columns = []
+        for track in tracks:
+            columns.append({
+                **track.columns,
+                'tick': track.columns['tick'] + duration_ticks
+            })
+            duration_ticks += track.duration_ticks
+
+        return tracks[0]._with(duration_ticks, **_concat(columns))
+
+
+class ColumnarMeasure(Measure):
+    """
+    Measure whose events live in numpy arrays; the vectorized mutators
+    below take columnar measures as well as tracks, and the humanize
+    mutators still work on its messages. ColumnarTrack.from_measures
+    concatenates the arrays of columnar measures without converting them.
+    """
+    def __init__(
+        self,
+        time_signature: TimeSignature = TimeSignature(4, 4),
+        columns: dict = None
+    ):
+        self.time_signature = time_signature
+        self.columns = columns if columns is not None else _empty_columns()
+        self.duration_ticks = TICKS_PER_BEAT * time_signature.numerator
+
+    def __len__(self):
+        return len(self.columns['tick'])
+
+    @staticmethod
+    def from_measure(measure: Measure):
+        if isinstance(measure, ColumnarMeasure):
+            return measure
+        return ColumnarMeasure(measure.time_signature, _measure_columns(measure))
+
+    @property
+    def messages(self):
+        return _messages_from_columns(self.columns)
+
+    @messages.setter
+    def messages(self, messages: List[Event]):
+        self.columns = _columns_from_messages(sorted(messages, key=lambda m: m.time))
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @columns.setter
+    def columns(self, columns: dict):
+        self._columns = columns
+        self._note_pairs = None
+
+    def to_measure(self):
+        return Measure(self.time_signature, self.messages)
+
+    def _with(self, **columns):
+        return ColumnarMeasure(self.time_signature, {**self.columns, **columns})
+
+
+# Vectorized counterparts of midigen.humanize, applied to a whole track or
+# measure at once.  `rng` may be a numpy Generator or a seed.
+def note_pairs(track: ColumnarTrack):
+    """
+    Match every note_on with the oldest open note_off of the same channel
+    and note; returns (on_index, off_index) arrays, where unmatched note_ons
+    have an off_index of -1 and orphaned note_offs are left out
+    """
+    c = track.columns
+    n = len(track)
+    key = c['channel'].astype(np.int64) << 16 | (c['note'].astype(np.int64) & 0xffff)
+    order = np.lexsort((c['tick'], key))
+    is_on = c['type'][order] == _TYPE_CODES['note_on']
+    key = key[order]
+
+    group_start = np.ones(n, dtype=bool)
+    group_start[1:] = key[1:] != key[:-1]
+    group = np.cumsum(group_start) - 1
+
+    # open-note balance per group; a note_off is an orphan when it would take
+    # the balance to a new low, i.e. when nothing is left to close
+    step = np.where(is_on, 1, -1)
+    balance = np.cumsum(step)
+    balance -= (balance - step)[group_start][group]
+    floor = 2 * n + 1
+    low = np.minimum.accumulate(np.minimum(balance, 0) - group * floor)
+    prior_low = np.empty(n, dtype=np.int64)
+    prior_low[:1] = 0
+    prior_low[1:] = low[:-1]
+    prior_low[group_start] = -group[group_start] * floor
+    orphan = ~is_on & (low < prior_low)
+    closes = ~is_on & ~orphan
+
+    def ranked(mask):
+        rank = np.cumsum(mask) - 1
+        rank -= (rank - mask + 1)[group_start][group]
+        return (group * (n + 1) + rank)[mask]
+
+    on_rank, off_rank = ranked(is_on), ranked(closes)
+    on_index = order[is_on]
+    off_index = np.full(len(on_index), -1, dtype=np.int64)
+    off_index[np.searchsorted(on_rank, off_rank)] = order[closes]
+    return on_index, off_index
+
+
+def _select(track: ColumnarTrack, index: np.ndarray, **columns):
+    return track._with(**{
+        name: columns.get(name, values)[index]
+        for name, values in track.columns.items()
+    })
+
+
+def swing(track: ColumnarTrack, swing: float = 0.1):
+    shift = int(swing * TICKS_PER_BEAT)
+    tick = track.columns['tick']
+    beat_frac = (tick % TICKS_PER_BEAT) / TICKS_PER_BEAT
+    return track._with(tick=np.maximum(0, tick + beat_frac * shift).astype(np.int64))
+
+
+def randomize_time(
+    track: ColumnarTrack,
+    beat_frac: float = 0.01,
+    rng: np.random.Generator = None,
+    bar_ticks: int = None
+):
+    """
+    Randomize time; on/off message pairs are shifted by the same amount.
+    With bar_ticks, notes are not moved before the start of their bar
+    """
+    rng = np.random.default_rng(rng)
+    on_index, off_index = note_pairs(track)
+    tick = track.columns['tick'].copy()
+    floor = 0 if bar_ticks is None else tick[on_index] // bar_ticks * bar_ticks
+    offs = np.trunc(
+        rng.normal(0, beat_frac * TICKS_PER_BEAT, len(on_index))
+    ).astype(np.int64)
+
+    matched = off_index >= 0
+    tick[on_index] = np.maximum(floor, tick[on_index] + offs)
+    off_floor = floor[matched] if bar_ticks is not None else 0
+    tick[off_index[matched]] = np.maximum(
+        off_floor,
+        tick[off_index[matched]] + offs[matched]
+    )
+    # orphaned note_offs are dropped, as in humanize.randomize_time
+    keep = np.sort(np.concatenate([on_index, off_index[matched]]))
+    return _select(track, keep, tick=tick)
+
+
+def randomize_velocity(
+    track: ColumnarTrack,
+    frac: float = 0.01,
+    rng: np.random.Generator = None
+):
+    rng = np.random.default_rng(rng)
+    velocity = track.columns['velocity']
+    noise = rng.normal(0, frac * 127, len(track))
+    return track._with(
+        velocity=np.clip(np.trunc(velocity + noise), 0, 127).astype(np.int16)
+    )
+
+
+def pulse(
+    track: ColumnarTrack,
+    ducking: float = 0.1,
+    even: bool = True,
+    bar_ticks: int = None
+):
+    """
+    Beats are counted from the start of the track, or from the start of each
+    bar if bar_ticks is given (needed for odd meters)
+    """
+    tick = track.columns['tick']
+    if bar_ticks is not None:
+        tick = tick % bar_ticks
+    beat, frac = np.divmod(tick, TICKS_PER_BEAT)
+    frac = frac / TICKS_PER_BEAT
+    late = frac > 0.5
+    frac = np.where(late, 1 - frac, frac)
+    beat = beat + late
+
+    off_beat = (beat % 2 == 0) == even
+    attenuation = np.where(
+        off_beat,
+        np.cos(frac * pi / 2),
+        np.sin(frac * pi / 2)
+    )
+    velocity = track.columns['velocity'] * (1 - ducking * attenuation)
+    return track._with(velocity=np.trunc(velocity).astype(np.int16))
+
+
+def dropout(
+    track: ColumnarTrack,
+    dropout_frac: float = 0.1,
+    rng: np.random.Generator = None
+):
+    """
+    Randomly drop out notes; note_offs are dropped with their note_on
+    """
+    rng = np.random.default_rng(rng)
+    on_index, off_index = note_pairs(track)
+    keep = rng.random(len(on_index)) > dropout_frac
+    kept_offs = off_index[keep]
+    return _select(
+        track,
+        np.sort(np.concatenate([on_index[keep], kept_offs[kept_offs >= 0]]))
+    )
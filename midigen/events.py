@@ -0,0 +1,108 @@
+"""
+Lightweight note events used in place of mido Messages while measures and
+tracks are built and transformed. Events have the attributes and copy()
+of a mido Message but skip its validation, and are only converted to mido
+when sent to a port; the MIDI file writer encodes them directly.
+"""
+_STATUS = {'note_off': 0x80, 'note_on': 0x90}
+
+
+class Event:
+    __slots__ = ('type', 'note', 'velocity', 'channel', 'time')
+
+    # mido.Message compatibility, see midifile._track_events
+    is_meta = False
+    is_realtime = False
+
+    def __init__(
+        self,
+        type: str,
+        note: int = 0,
+        velocity: int = 64,
+        channel: int = 0,
+        time: int = 0
+    ):
+        if type not in _STATUS:
+            raise ValueError(f'events are note_on or note_off, not {type}')
+        self.type = type
+        self.note = note
+        self.velocity = velocity
+        self.channel = channel
+        self.time = time
+
+    def copy(self, **overrides):
+        event = Event(self.type, self.note, self.velocity, self.channel, self.time)
+        for name, value in overrides.items():
+            setattr(event, name, value)
+        return event
+
+    def bytes(self):
+        # copies aren't validated, so check the values when encoding
+        if not (0 <= self.note <= 127 and 0 <= self.velocity <= 127 and 0 <= self.channel <= 15):
+            raise ValueError(
+                f'note and velocity must be in range 0..127 and channel in 0..15: {self!r}'
+            )
+        return [_STATUS[self.type] | self.channel, self.note, self.velocity]
+
+    def to_mido(self):
+        from mido import Message
+        return Message(
+            self.type,
+            note=self.note,
+            velocity=self.velocity,
+            channel=self.channel,
+            time=self.time
+        )
+
+    @staticmethod
+    def from_mido(msg):
+        return Event(msg.type, msg.note, msg.velocity, msg.channel, msg.time)
+
+    def _fields(self):
+        return self.type, self.note, self.velocity, self.channel, self.time
+
+    def __eq__(self, other):
+        # equal to Events and mido note messages with the same fields
+        try:
+            return self._fields() == (
+                other.type, other.note, other.velocity, other.channel, other.time
+            )
+        except AttributeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (
+            f'Event({self.type!r}, note={self.note}, velocity={self.velocity}, '
+            f'channel={self.channel}, time={self.time})'
+        )
+
+
+class FrozenEvent(Event):
+    """
+    An Event that can't be modified, for messages shared between measures
+    (see Measure.from_pattern); copy() returns a regular Event
+    """
+    __slots__ = ()
+
+    def __init__(self, *args, **kwargs):
+        event = Event(*args, **kwargs)
+        for name in Event.__slots__:
+            object.__setattr__(self, name, getattr(event, name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('frozen events can\'t be modified, copy() them instead')
+
+    def __delattr__(self, name):
+        raise AttributeError('frozen events can\'t be modified, copy() them instead')
+
+    def __reduce__(self):
+        return FrozenEvent, self._fields()
+
+
+def to_mido(msg):
+    """
+    A mido Message for an Event; mido messages are passed through
+    """
+    return msg.to_mido() if isinstance(msg, Event) else msg
@@ -1,21 +1,252 @@
 import os
 import argparse
+import csv
+import json
+import random
+import sys
 import time
-
-import mido
+from typing import List
 
 from midigen.keys import Key, CMajor
 from midigen.notes import Note
 from midigen.time import TimeSignature, Measure
-from midigen.sequencer import Track, Song
+from midigen.sequencer import Track, Song, open_output
 from midigen.humanize import randomize_time, randomize_velocity, swing, pulse, dropout
 from midigen.instruments import INSTRUMENTS
 from midigen.markov import Graph
-from midigen import rhythm
+from midigen import profiling, rhythm
+
+
+def render(
+    key: str = 'C',
+    chords: List[str] = ['I'],
+    loop: int = 1,
+    swing_amount: float = 0.03,
+    randomize: float = 0.001,
+    stream: bool = False
+):
+    """
+    Generate the beat, bass, chord and melody tracks for a chord progression;
+    with stream, measures are only generated as the song is played or written
+    """
+    keys = Key.parse_many([key + chord for chord in chords])
+
+    def humanize(measure):
+        with profiling.stage('humanize'):
+            for mutator, amount in (
+                (pulse, 0.1),
+                (randomize_time, randomize),
+                (randomize_velocity, randomize),
+                (swing, swing_amount),
+                (dropout, 0.1)
+            ):
+                measure = mutator(measure, amount)
+            return measure
+
+    if stream:
+        make_track = Track.from_measure_stream
+    else:
+        make_track = Track.from_measures
+
+    beat = make_track(
+        _staged('beat', (
+            Measure(messages=[
+                msg
+                for pattern in (
+                    rhythm.four_on_the_floor,
+                    rhythm.son_clave,
+                    rhythm.straight_16ths
+                )
+                for msg in pattern(
+                    velocity=90,
+                ).mutate(humanize).messages
+            ])
+            for _ in range(loop)
+            for _ in range(len(chords))
+        )),
+        channel=9,
+        name='beat'
+    )
+
+    with profiling.stage('graphs'):
+        bass_graph = Graph(
+            key=CMajor,
+            min_note=Note.E.value_for_octave(0),
+            max_note=Note.E.value_for_octave(2),
+            degrees=[1, 5]
+        ).strengthen_connections(
+            # strong attractor back to root / fifth
+            [
+                (CMajor.note(degree), CMajor.note(target))
+                for degree in range(2, 8)
+                for target in (1, 5)
+            ],
+            5
+        )
+
+    bass = make_track(_staged('bass', (
+        Measure.from_pattern(
+            pattern,
+            time_signature=TimeSignature(4, 4),
+            velocity=120,
+            duration=0.7
+        ).mutate(humanize)
+        for _ in range(loop)
+        for pattern in bass_graph.sequences_for_keys(
+            [k for k, e in keys],
+            4
+        )
+    )),
+        channel=0,
+        program=INSTRUMENTS['Acoustic Bass'],
+        name='bass',
+    )
+
+    chord_track = make_track(_staged('chords', (
+        Measure.from_pattern(
+            pattern=[
+                # keep chords close to the key's root triad
+                key.chord(match_voicing=key.triad())[1:]  # drop root
+            ] * 4,
+            time_signature=TimeSignature(4, 4),
+            velocity=60,
+            duration=0.7
+        ).mutate(humanize)
+        for _ in range(loop)
+        for key, extensions in keys
+    )),
+        channel=1,
+        name='chords',
+    ).shift_pitch(-12)
+
+    with profiling.stage('graphs'):
+        melody_graph = Graph(
+            min_note=Note.C.value_for_octave(3),
+            max_note=Note.C.value_for_octave(5),
+        )
+
+    melody = make_track(_staged('melody', (
+        Measure.from_pattern(
+            pattern,
+            time_signature=TimeSignature(4, 4),
+            velocity=90,
+            duration=0.7
+        ).mutate(humanize).mutate(dropout).mutate(dropout)
+        for _ in range(loop)
+        for pattern in melody_graph.sequences_for_keys(
+            keys=[k for k, e in keys],
+            notes_per_key=8,
+        )
+    )),
+        channel=2,
+        program=INSTRUMENTS['Kalimba'],
+        name='melody',
+    )
+
+    return Song([
+        beat, bass, chord_track, melody
+    ])
+
+
+def _staged(name: str, measures):
+    """
+    Attribute the work of generating each measure to a profiling stage
+    """
+    measures = iter(measures)
+    while True:
+        with profiling.stage(name):
+            measure = next(measures, None)
+        if measure is None:
+            return
+        yield measure
+
+
+def render_job(job: dict):
+    """
+    Render one batch manifest entry to its output file; returns the time
+    taken in seconds
+    """
+    def field(name: str, default, convert=str):
+        # only missing or empty fields get the default; 0 is a valid value
+        value = job.get(name)
+        return default if value in (None, '') else convert(value)
+
+    tstart = time.perf_counter()
+    chords = job['chords']
+    if isinstance(chords, str):
+        chords = chords.split()
+    seed = field('seed', None, int)
+    if seed is not None:
+        random.seed(seed)
+
+    render(
+        field('key', 'C'),
+        chords,
+        field('loop', 1, int),
+        field('swing', 0.03, float),
+        field('randomize', 0.001, float),
+    ).to_midi(job['output'], tempo=field('tempo', 90, int))
+    return time.perf_counter() - tstart
+
+
+def read_manifest(filename: str):
+    """
+    Batch jobs from a JSON list of objects or a CSV file with a header row;
+    fields are key, chords, tempo, loop, seed, swing, randomize and output
+    """
+    with open(filename) as fh:
+        if filename.endswith('.json'):
+            return json.load(fh)
+        return list(csv.DictReader(fh))
+
+
+def batch(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        prog='midigen batch',
+        description='Render every progression in a manifest with a process pool'
+    )
+    parser.add_argument(
+        'manifest',
+        help='JSON or CSV manifest (key, chords, tempo, loop, seed, output)'
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='number of worker processes'
+    )
+    args = parser.parse_args(argv)
+    from concurrent.futures import ProcessPoolExecutor, as_completed
 
+    jobs = read_manifest(args.manifest)
+    failures = 0
+    tstart = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        futures = {pool.submit(render_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            output = futures[future].get('output')
+            try:
+                print(f'{future.result():8.3f}s  {output}')
+            except Exception as e:
+                failures += 1
+                print(f'  FAILED  {output}: {e!r}', file=sys.stderr)
 
-def main():
-    parser = argparse.ArgumentParser()
+    print(
+        f'{len(jobs) - failures}/{len(jobs)} rendered '
+        f'in {time.perf_counter() - tstart:.3f}s'
+    )
+    return 1 if failures else 0
+
+
+def main(argv: List[str] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['batch']:
+        return batch(argv[1:])
+
+    parser = argparse.ArgumentParser(
+        epilog='Run "midigen batch MANIFEST" to render many progressions in parallel'
+    )
     parser.add_argument(
         '-k',
         '--key',
@@ -78,6 +309,25 @@ def main():
         help='randomize amount (0-1)'
     )
 
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='random seed, for reproducible output'
+    )
+
+    parser.add_argument(
+        '--profile',
+        default=False,
+        action='store_true',
+        help='print time, call counts and peak memory per stage'
+    )
+
+    parser.add_argument(
+        '--profile-dump',
+        metavar='FILE',
+        help='with --profile, also write cProfile stats to FILE'
+    )
+
     parser.add_argument(
         '-n',
         '--name',
@@ -93,124 +343,42 @@ def main():
         help='open ableton for playback (macOS only)',
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
 
-    keys = [Key.parse(args.key + chord) for chord in args.chords]
+    if args.profile:
+        with profiling.profile(args.profile_dump) as profiler:
+            run(args)
+        print(profiler.report(), file=sys.stderr)
+    else:
+        run(args)
 
-    def humanize(measure):
-        for mutator, amount in (
-            (pulse, 0.1),
-            (randomize_time, args.randomize),
-            (randomize_velocity, args.randomize),
-            (swing, args.swing),
-            (dropout, 0.1)
-        ):
-            measure = mutator(measure, amount)
-        return measure
-
-    beat = Track.string_tracks([
-        Track.from_measures([
-            pattern(
-                velocity=90,
-            ).mutate(humanize)
-            for pattern in (
-                rhythm.four_on_the_floor,
-                rhythm.son_clave,
-                rhythm.straight_16ths
-            )
-        ],
-            channel=9,
-            stack=True,
-            name='beat'
-        )
-        for _ in range(args.loop)
-        for _ in range(len(args.chords))
-    ])
 
-    bass = Track.from_measures([
-        Measure.from_pattern(
-            pattern,
-            time_signature=TimeSignature(4, 4),
-            velocity=120,
-            duration=0.7
-        ).mutate(humanize)
-        for _ in range(args.loop)
-        for pattern in Graph(
-            key=CMajor,
-            min_note=Note.E.value_for_octave(0),
-            max_note=Note.E.value_for_octave(2),
-            degrees=[1, 5]
-        ).strengthen_connections(
-            # strong attractor back to root / fifth
-            [
-                (CMajor.note(degree), CMajor.note(target))
-                for degree in range(2, 8)
-                for target in (1, 5)
-            ],
-            5
-        ).sequences_for_keys(
-            [k for k, e in keys],
-            4
-        )
-    ],
-        channel=0,
-        program=INSTRUMENTS['Acoustic Bass'],
-        name='bass',
-    )
-
-    chords = Track.from_measures([
-        Measure.from_pattern(
-            pattern=[
-                # keep chords close to the key's root triad
-                key.chord(match_voicing=key.triad())[1:]  # drop root
-            ] * 4,
-            time_signature=TimeSignature(4, 4),
-            velocity=60,
-            duration=0.7
-        ).mutate(humanize)
-        for _ in range(args.loop)
-        for key, extensions in keys
-    ],
-        channel=1,
-        name='chords',
-    ).shift_pitch(-12)
-
-    melody = Track.from_measures([
-        Measure.from_pattern(
-            pattern,
-            time_signature=TimeSignature(4, 4),
-            velocity=90,
-            duration=0.7
-        ).mutate(humanize).mutate(dropout).mutate(dropout)
-        for _ in range(args.loop)
-        for pattern in Graph(
-            min_note=Note.C.value_for_octave(3),
-            max_note=Note.C.value_for_octave(5),
-        ).sequences_for_keys(
-            keys=[k for k, e in keys],
-            notes_per_key=8,
-        )
-    ],
-        channel=2,
-        program=INSTRUMENTS['Kalimba'],
-        name='melody',
+def run(args: argparse.Namespace):
+    song = render(
+        args.key,
+        args.chords,
+        args.loop,
+        args.swing,
+        args.randomize,
+        # when only playing, measures are generated as they are played
+        stream=args.play and not args.output
     )
 
-    song = Song([
-        beat, bass, chords, melody
-    ])
-
     if args.output:
-        song.to_midi(args.output, tempo=args.tempo)
+        with profiling.stage('to_midi'):
+            song.to_midi(args.output, tempo=args.tempo)
 
     if args.play:
         if args.ableton:
             os.system(f'open "{os.path.join(os.path.dirname(__file__), "midigen.als")}"')
-        port = mido.open_output(args.name, virtual=True)
+        port = open_output(args.name)
         time.sleep(2)
         port.panic()  # clear anything that was previous playing
-        song.play(port, args.tempo)
+        with profiling.stage('play'):
+            song.play(port, args.tempo)
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
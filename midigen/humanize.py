@@ -23,31 +23,22 @@ def randomize_time(measure: Measure, beat_frac: float = 0.01):
     """
     Randomize time; on/off message pairs must be shifted by the same amount
     """
-    on_msgs = [msg for msg in measure.messages if msg.type == 'note_on']
-    off_msgs = [msg for msg in measure.messages if msg.type == 'note_off']
-    other_messages = [msg for msg in measure.messages if msg not in on_msgs + off_msgs]
+    pairs, other_messages = measure.note_pairs()
 
     randomized = []
-    for on_msg in on_msgs:
+    for on_msg, off_msg in pairs:
         offs = int(random.normalvariate(0, beat_frac * TICKS_PER_BEAT))
         randomized.append(
             on_msg.copy(time=max(0, on_msg.time + offs))
         )
-        try:
-            matched_off = next(
-                off_msg
-                for off_msg in off_msgs
-                if off_msg.note == on_msg.note and off_msg.time >= on_msg.time
-            )
+        if off_msg is not None:
             randomized.append(
-                matched_off.copy(time=max(0, matched_off.time + offs))
+                off_msg.copy(time=max(0, off_msg.time + offs))
             )
-        except StopIteration:
-            pass
 
     return Measure(
         measure.time_signature,
-        sorted(randomized + other_messages, key=lambda msg: msg.time)
+        sorted([*randomized, *other_messages], key=lambda msg: msg.time)
     )
 
 
@@ -99,20 +90,19 @@ def pulse(measure: Measure, ducking: float = 0.1, even: bool = True):
 
 def dropout(measure: Measure, dropout_frac: float = 0.1):
     """
-    Randomly drop out notes
+    Randomly drop out notes; a note_off is dropped with its note_on
     """
-    on_msgs = [msg for msg in measure.messages if msg.type == 'note_on']
-    off_msgs = [msg for msg in measure.messages if msg.type == 'note_off']
-    other_messages = [msg for msg in measure.messages if msg not in on_msgs + off_msgs]
+    pairs, other_messages = measure.note_pairs()
 
     randomized = [
         msg
-        for pair in zip(on_msgs, off_msgs)
+        for pair in pairs
         if random.random() > dropout_frac
         for msg in pair
+        if msg is not None
     ]
 
     return Measure(
         measure.time_signature,
-        sorted(randomized + other_messages, key=lambda msg: msg.time)
+        sorted([*randomized, *other_messages], key=lambda msg: msg.time)
     )
@@ -1,7 +1,7 @@
 import re
 from typing import List
 from enum import Enum
-from itertools import product
+from functools import lru_cache
 
 from midigen.sequencer import Track
 from midigen.notes import Note
@@ -28,16 +28,34 @@ class Mode(Enum):
     Diminished = 7
 
     def __add__(self, offset: int):
-        for mode in Mode:
-            if (mode.value) % 8 == (self.value + offset) % 8:
-                return mode
+        return _MODES[(self.value + offset) % 8]
 
     def __sub__(self, offset: int):
         return self + (-offset)
 
 
+# (mode value + offset) % 8 -> Mode; 0 has no mode
+_MODES = [None] + list(Mode)
+
+
 class Key:
-    def __init__(self, key: Note, mode: Mode = Mode.Major):
+    # keys are interned: Key(note, mode) builds each key once and returns the
+    # same instance after that, so keys must not be modified
+    _instances = {}
+
+    def __new__(cls, key: Note, mode: Mode = Mode.Major):
+        try:
+            return cls._instances[(key, mode)]
+        except KeyError:
+            self = super().__new__(cls)
+            self._init(key, mode)
+            cls._instances[(key, mode)] = self
+            return self
+
+    def __getnewargs__(self):
+        return self.key, self.mode
+
+    def _init(self, key: Note, mode: Mode):
         self.key = key
         self.mode = mode
 
@@ -97,30 +115,15 @@ class Key:
 
     @staticmethod
     def parse(key: str):
-        match = re.match(
-            (
-                r'(?P<note>([A-Ga-g][b|#]?)?)'
-                r'(?P<degree>[iIV]*)'
-                r'(?P<mode>(maj|min|m|M)?)'
-                r'(?P<sus>(sus)?)'
-                r'(?P<ext>(ext)?[0-9]*)'
-            ),
-            key,
-            re.IGNORECASE
-        ).groupdict()
+        """
+        (Key, extension) for a chord symbol (Cmaj7, Dm7, ii, V7, etc.);
+        parsed symbols are cached
+        """
+        return _parse_symbol(key)
 
-        return Key(
-            Note[match['note'].replace('#', '_SHARP') or 'C'],
-            Mode[{
-                'm': 'Minor',
-                'min': 'Minor',
-                'maj': 'Major',
-                'Maj': 'Major',
-                'M': 'Major',
-            }[(match['mode'] or 'M').title()]],
-        ).relative_key(
-            Mode[match['degree'] or 'I'].value
-        ), match['ext']
+    @staticmethod
+    def parse_many(symbols: List[str]):
+        return [Key.parse(symbol) for symbol in symbols]
 
     @staticmethod
     def parse_chord(chord: str, match_voicing: List[int] = None):
@@ -143,20 +146,7 @@ class Key:
 
         if match_voicing:
             # find a voicing that best matches the indicated tones
-            return min([
-                [
-                    n + o for n, o in zip(notes, offsets)
-                ]
-                for offsets in product(
-                    [-12, 0, 12],
-                    repeat=len(notes)
-                )
-            ],
-                key=lambda voicing: sum([
-                    abs(n - m)
-                    for n, m in product(voicing, match_voicing)
-                ])
-            )
+            return list(_match_voicing(tuple(notes), tuple(match_voicing)))
         else:
             return notes
 
@@ -176,10 +166,128 @@ class Key:
     def __eq__(self, other: 'Key'):
         return set(self.notes) == set(other.notes)
 
+    def __hash__(self):
+        return hash(frozenset(self.notes))
+
     def __repr__(self):
         return f'{self.key.name} {self.mode.name}'
 
 
+_CHORD_SYMBOL = re.compile(
+    (
+        r'(?P<note>([A-Ga-g][b|#]?)?)'
+        r'(?P<degree>[iIV]*)'
+        r'(?P<mode>(maj|min|m|M)?)'
+        r'(?P<sus>(sus)?)'
+        r'(?P<ext>(ext)?[0-9]*)'
+    ),
+    re.IGNORECASE
+)
+
+_MODE_NAMES = {
+    'm': 'Minor',
+    'min': 'Minor',
+    'maj': 'Major',
+    'Maj': 'Major',
+    'M': 'Major',
+}
+
+
+@lru_cache(maxsize=4096)
+def _parse_symbol(symbol: str):
+    match = _CHORD_SYMBOL.match(symbol).groupdict()
+    return Key(
+        Note[match['note'].replace('#', '_SHARP') or 'C'],
+        Mode[_MODE_NAMES[(match['mode'] or 'M').title()]],
+    ).relative_key(
+        Mode[match['degree'] or 'I'].value
+    ), match['ext']
+
+
+@lru_cache(maxsize=1024)
+def _match_voicing(notes: tuple, voicing: tuple):
+    """
+    Shift each note by -12, 0 or 12 to minimize the total distance between
+    every note and every tone of the voicing; the distance is a sum of
+    per-note terms, so each note's octave is chosen on its own (ties go to
+    the lowest octave, as a search over every combination would)
+    """
+    return tuple(
+        min(
+            (n - 12, n, n + 12),
+            key=lambda v: sum(abs(v - m) for m in voicing)
+        )
+        for n in notes
+    )
+
+
+def voice_progression(
+    keys: List[Key],
+    extensions: List[List[int]] = None,
+    start_voicing: List[int] = None,
+    beam: int = 4
+):
+    """
+    Voicings for every chord of a progression that minimize the total voice
+    movement, the distance from each note to the nearest note of the
+    previous chord, with a Viterbi search. Each chord's candidates are the
+    closest voicings to the previous chord's surviving candidates, and only
+    the `beam` cheapest paths are kept per chord.
+    """
+    if not keys:
+        return []
+
+    extensions = extensions or [[]] * len(keys)
+    paths = {
+        tuple(start_voicing or keys[0].chord(extensions[0])): (0, None)
+    }
+    history = []
+    for key, ext in zip(keys, extensions):
+        notes = tuple(key.chord(ext))
+        candidates = {_closest_voicing(notes, prior) for prior in paths}
+        candidates.update(_octaves(notes))
+        step = {}
+        for voicing in candidates:
+            step[voicing] = min(
+                (cost + _movement(prior, voicing), prior)
+                for prior, (cost, _) in paths.items()
+            )
+        paths = dict(sorted(step.items(), key=lambda item: item[1])[:beam])
+        history.append(paths)
+
+    # trace the cheapest path back from the last chord
+    voicing = min(paths, key=paths.get)
+    voicings = []
+    for paths in reversed(history):
+        voicings.append(list(voicing))
+        voicing = paths[voicing][1]
+    return voicings[::-1]
+
+
+def _octaves(notes: tuple):
+    return [tuple(n + o for n in notes) for o in (-12, 0, 12)]
+
+
+@lru_cache(maxsize=4096)
+def _movement(voicing1: tuple, voicing2: tuple):
+    return sum(min(abs(n - m) for m in voicing1) for n in voicing2)
+
+
+@lru_cache(maxsize=4096)
+def _closest_voicing(notes: tuple, voicing: tuple):
+    """
+    Shift each note by -12, 0 or 12 to minimize its distance to the nearest
+    tone of the voicing; like _match_voicing, the cost is per note
+    """
+    return tuple(sorted(
+        min(
+            (n - 12, n, n + 12),
+            key=lambda v: min(abs(v - m) for m in voicing)
+        )
+        for n in notes
+    ))
+
+
 def _rotate(seq, n):
     return seq[n:] + seq[:n]
 
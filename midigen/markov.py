@@ -5,26 +5,81 @@ from itertools import permutations
 from midigen.keys import Key, Note, Mode
 
 
+class AliasTable:
+    """
+    Walker's alias method: O(n) to build, O(1) per sample
+    """
+    def __init__(self, items: list, weights: List[float]):
+        n = len(weights)
+        total = sum(weights)
+        if total <= 0:
+            raise ValueError('Total of weights must be greater than zero')
+
+        scaled = [w * n / total for w in weights]
+        self.items = items
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, g = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = g
+            scaled[g] += scaled[s] - 1
+            (small if scaled[g] < 1 else large).append(g)
+
+    def sample(self, rand: callable = random.random):
+        # one uniform draw picks both the column and the coin flip
+        u = rand() * len(self.items)
+        i = min(int(u), len(self.items) - 1)
+        return self.items[i if u - i < self.prob[i] else self.alias[i]]
+
+
 class Node:
+    __slots__ = ('value', 'edges', '_sampler')
+
     def __init__(self, value: int = 0):
         self.value = value
         self.edges = []
+        self._sampler = None
 
     def add_edge(self, node: 'Node', weight: float = 1.0):
         self.edges.append(Edge(self, node, weight))
+        self._sampler = None
+
+    def compile(self):
+        """
+        Build the alias table used by next(); rebuilt whenever an edge
+        weight changes
+        """
+        if self._sampler is None:
+            self._sampler = AliasTable(
+                [edge.node2 for edge in self.edges],
+                [edge.weight for edge in self.edges]
+            )
+        return self._sampler
 
     def next(self):
-        return random.choices(
-            self.edges,
-            weights=[edge.weight for edge in self.edges]
-        )[0].node2
+        return self.compile().sample()
 
 
 class Edge:
+    __slots__ = ('node1', 'node2', '_weight')
+
     def __init__(self, node1: Node, node2: Node, weight: float = 1.0):
         self.node1 = node1
         self.node2 = node2
-        self.weight = weight
+        self._weight = weight
+
+    @property
+    def weight(self):
+        return self._weight
+
+    @weight.setter
+    def weight(self, weight: float):
+        self._weight = weight
+        # invalidate the source node's compiled transitions
+        self.node1._sampler = None
 
 
 class Graph:
@@ -35,47 +90,119 @@ class Graph:
         max_note: int = Note.C.value_for_octave(6),
         edge_weights: List[float] = None,
         degrees: List[int] = list(range(1, 8)),
+        max_interval: int = None,
     ):
+        """
+        Every pair of notes is connected in both directions, one edge per
+        direction, and edge_weights give the weight of each edge in the
+        order of self.edges. With max_interval, only notes at most that many
+        semitones apart are connected; edge_weights then index the remaining
+        connections, and connections past the end of edge_weights are
+        weighted by distance
+        """
         self.key = key
         self.degrees = degrees
         self.min_note = min_note
         self.max_note = max_note
-        self.nodes = [
-            Node(note_value)
+        self.max_interval = max_interval
+        # (octave, degree) of each node, see _derive
+        self.positions = [
+            (octave, degree)
             for octave in range(6)
             for degree in self.degrees
-            for note_value in [self.key.note(degree).value_for_octave(octave)]
-            if min_note <= note_value <= max_note
+            if min_note <= self.key.note(degree).value_for_octave(octave) <= max_note
+        ]
+        self.nodes = [
+            Node(self.key.note(degree).value_for_octave(octave))
+            for octave, degree in self.positions
         ]
 
         # connect all nodes with edges weighted by distance
-        for i, (n1, n2) in enumerate(permutations(self.nodes, 2)):
-            if edge_weights:
+        pairs = permutations(self.nodes, 2)
+        if max_interval is not None:
+            pairs = (
+                (n1, n2)
+                for n1, n2 in pairs
+                if abs(n1.value - n2.value) <= max_interval
+            )
+        for i, (n1, n2) in enumerate(pairs):
+            if edge_weights and (max_interval is None or i < len(edge_weights)):
                 weight = edge_weights[i]
             else:
                 weight = 1 / (abs(n1.value - n2.value) + 1)
             n1.add_edge(n2, weight)
-            n2.add_edge(n1, weight)
+
+        if max_interval is not None:
+            for node in self.nodes:
+                if not node.edges:
+                    raise ValueError(
+                        f'max_interval={max_interval} leaves note {node.value} '
+                        'without connections'
+                    )
 
         self.edges = [
             edge
             for note in self.nodes
             for edge in note.edges
         ]
+        # (signature, {(root, mode): Graph}), see sequences_for_keys
+        self._key_graphs = (None, {})
+        # see _edges_by_pitch_class
+        self._edge_index = None
+
+    def compile(self):
+        """
+        Precompute the transition tables of every node, so each step of a
+        walk is O(1); tables are invalidated when edge weights change
+        """
+        for node in self.nodes:
+            node.compile()
+        return self
 
     def clear_weights(self):
         for edge in self.edges:
             edge.weight = 0
         return self
 
+    def _edges_by_pitch_class(self):
+        """
+        {(pitch class, pitch class): [Edge]} for edges spanning at most an
+        octave; built once per graph
+        """
+        if self._edge_index is None:
+            self._edge_index = {}
+            for edge in self.edges:
+                if abs(edge.node1.value - edge.node2.value) <= 12:
+                    self._edge_index.setdefault(
+                        (edge.node1.value % 12, edge.node2.value % 12),
+                        []
+                    ).append(edge)
+        return self._edge_index
+
+    def edges_between(self, pitch_class1: int, pitch_class2: int):
+        """
+        Edges from pitch class 1 to pitch class 2 (0 = C) within an octave
+        """
+        return self._edges_by_pitch_class().get(
+            (pitch_class1 % 12, pitch_class2 % 12),
+            []
+        )
+
     def strengthen_connections(self, pairs: List[Note], weight: float = 2.0):
         for n1, n2 in pairs:
-            for edge in self.edges:
-                if (
-                    Note.from_value(edge.node1.value) == n1 and
-                    Note.from_value(edge.node2.value) == n2 and
-                    abs(edge.node1.value - edge.node2.value) <= 12
-                ):
+            for edge in self.edges_between(n1.value, n2.value):
+                edge.weight += weight
+        return self
+
+    def strengthen_pitch_classes(self, bias: List[List[float]]):
+        """
+        Add bias[i][j] to the weight of every connection (within an octave)
+        from pitch class i to pitch class j, for a 12 x 12 bias matrix
+        """
+        for (pc1, pc2), edges in self._edges_by_pitch_class().items():
+            weight = bias[pc1][pc2]
+            if weight:
+                for edge in edges:
                     edge.weight += weight
         return self
 
@@ -96,19 +223,124 @@ class Graph:
         start_note = min(self.nodes, key=lambda n: abs(n.value - other[-1]))
         return self.generate_sequence(len(other), start_note.value)
 
+    def follow_sequences(self, other: List[int], n: int, seed=None):
+        """
+        n walks continuing from the end of `other`, as in follow()
+        """
+        if not other:
+            raise ValueError('follow_sequences needs a sequence to continue from')
+        start_note = min(self.nodes, key=lambda node: abs(node.value - other[-1]))
+        return self.generate_sequences(n, len(other), start_note.value, seed)
+
+    def _transition_arrays(self):
+        """
+        The nodes' alias tables flattened into numpy arrays (CSR layout)
+        """
+        import numpy as np
+
+        position = {id(node): i for i, node in enumerate(self.nodes)}
+        tables = [node.compile() if node.edges else None for node in self.nodes]
+        degree = np.array([len(t.items) if t else 0 for t in tables])
+        start = np.concatenate([[0], np.cumsum(degree)[:-1]])
+        target = np.array(
+            [position[id(n)] for t in tables if t for n in t.items],
+            dtype=np.int64
+        )
+        prob = np.array([p for t in tables if t for p in t.prob])
+        alias = np.array(
+            [s + a for t, s in zip(tables, start) if t for a in t.alias],
+            dtype=np.int64
+        )
+        return degree, start, target, prob, target[alias] if len(alias) else alias
+
+    def generate_sequences(
+        self,
+        n: int,
+        length: int = 16,
+        start_note: int = None,
+        seed=None
+    ):
+        """
+        n independent random walks as an (n x length) numpy array of note
+        values, generated together; seed is an int or numpy Generator and
+        the global random state is not used
+        """
+        if length < 1:
+            raise ValueError(f'walks must have at least one note, not {length}')
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        degree, start, target, prob, alias_target = self._transition_arrays()
+        values = np.array([node.value for node in self.nodes])
+
+        walks = np.empty((n, length), dtype=np.int64)
+        walks[:, 0] = next(
+            (i for i, node in enumerate(self.nodes) if node.value == start_note),
+            0
+        )
+        for step in range(1, length):
+            current = walks[:, step - 1]
+            if not degree[current].all():
+                raise ValueError('walk reached a node without edges')
+            u = rng.random(n) * degree[current]
+            column = np.minimum(u.astype(np.int64), degree[current] - 1)
+            j = start[current] + column
+            walks[:, step] = np.where(u - column < prob[j], target[j], alias_target[j])
+
+        return values[walks]
+
+    def _edges_by_position(self):
+        """
+        {((octave, degree), (octave, degree)): Edge}
+        """
+        position = dict(zip(map(id, self.nodes), self.positions))
+        return {
+            (position[id(edge.node1)], position[id(edge.node2)]): edge
+            for edge in self.edges
+        }
+
+    def _derive(self, key: Key):
+        """
+        The same graph in another key; each connection keeps the weight of
+        the connection between the same (octave, degree) positions here, and
+        positions that only exist in the new key are weighted by distance
+        """
+        graph = Graph(
+            key,
+            self.min_note,
+            self.max_note,
+            degrees=self.degrees,
+            max_interval=self.max_interval
+        )
+        weights = self._edges_by_position()
+        for position, edge in graph._edges_by_position().items():
+            if position in weights:
+                edge.weight = weights[position].weight
+        return graph
+
     def sequences_for_keys(
         self,
         keys: List[Key],
         notes_per_key: int = 8,
     ):
+        # derived graphs are cached per key, as long as this graph's
+        # configuration and weights don't change
+        signature = (
+            tuple(self.degrees),
+            self.min_note,
+            self.max_note,
+            self.max_interval,
+            tuple(e.weight for e in self.edges)
+        )
+        if self._key_graphs[0] != signature:
+            self._key_graphs = (signature, {})
+        graphs = self._key_graphs[1]
+
         def graph_for_key(key: Key):
-            return Graph(
-                key,
-                self.min_note,
-                self.max_note,
-                degrees=self.degrees,
-                edge_weights=[e.weight for e in self.edges]
-            )
+            cache_key = (key.key, key.mode)
+            if cache_key not in graphs:
+                graphs[cache_key] = self._derive(key)
+            return graphs[cache_key]
 
         s = [graph_for_key(keys[0]).generate_sequence(notes_per_key)]
         for key in keys[1:]:
@@ -0,0 +1,117 @@
+"""
+Streaming standard MIDI file writer: track chunks are encoded straight
+from message iterators, and chunk lengths are patched in afterwards, so
+a song never has to be held in memory as a whole.
+"""
+import io
+import struct
+from numbers import Integral
+from typing import BinaryIO, Iterable, List
+
+from midigen.time import TICKS_PER_BEAT
+
+
+def encode_variable_int(value: int):
+    encoded = [value & 0x7f]
+    value >>= 7
+    while value:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    return bytes(reversed(encoded))
+
+
+def _fix_end_of_track(messages: Iterable):
+    """
+    Drop end_of_track messages, folding their delta times into the next
+    message, and end with a single end_of_track (like mido's MidiFile.save)
+    """
+    from mido import MetaMessage
+
+    accum = 0
+    for msg in messages:
+        if msg.type == 'end_of_track':
+            accum += msg.time
+        elif accum:
+            yield msg.copy(time=msg.time + accum)
+            accum = 0
+        else:
+            yield msg
+
+    yield MetaMessage('end_of_track', time=accum)
+
+
+def _track_events(messages: Iterable):
+    """
+    Encoded events of a track chunk, using running status
+    """
+    running_status = None
+    for msg in _fix_end_of_track(messages):
+        if not isinstance(msg.time, Integral):
+            raise ValueError('message time must be int in MIDI file')
+        if msg.time < 0:
+            raise ValueError('message time must be non-negative in MIDI file')
+        if msg.is_realtime:
+            raise ValueError('realtime messages are not allowed in MIDI files')
+
+        delta = encode_variable_int(msg.time)
+        if msg.is_meta:
+            yield delta + bytes(msg.bytes())
+            running_status = None
+        elif msg.type == 'sysex':
+            yield (
+                delta + b'\xf0' +
+                encode_variable_int(len(msg.data) + 1) +
+                bytes(msg.data) + b'\xf7'
+            )
+            running_status = None
+        else:
+            data = bytes(msg.bytes())
+            status = data[0]
+            yield delta + (data[1:] if status == running_status else data)
+            running_status = status if status < 0xf0 else None
+
+
+def write_track(file: BinaryIO, messages: Iterable):
+    """
+    Write one MTrk chunk from messages with delta times
+    """
+    if not _seekable(file):
+        data = b''.join(_track_events(messages))
+        file.write(b'MTrk' + struct.pack('>L', len(data)) + data)
+        return
+
+    file.write(b'MTrk')
+    length_pos = file.tell()
+    file.write(b'\0\0\0\0')
+    length = 0
+    for event in _track_events(messages):
+        file.write(event)
+        length += len(event)
+
+    end = file.tell()
+    file.seek(length_pos)
+    file.write(struct.pack('>L', length))
+    file.seek(end)
+
+
+def write_midi(
+    file: BinaryIO,
+    tracks: List[Iterable],
+    ticks_per_beat: int = TICKS_PER_BEAT,
+    midi_type: int = 1
+):
+    """
+    Write a MIDI file; tracks is a list of message iterables, each of which
+    is consumed as its chunk is written
+    """
+    file.write(b'MThd' + struct.pack('>L', 6))
+    file.write(struct.pack('>hhh', midi_type, len(tracks), ticks_per_beat))
+    for messages in tracks:
+        write_track(file, messages)
+
+
+def _seekable(file: BinaryIO):
+    try:
+        return file.seekable()
+    except (AttributeError, io.UnsupportedOperation):
+        return False
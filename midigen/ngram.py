@@ -0,0 +1,353 @@
+"""
+Higher order Markov model of note (and optionally duration) transitions,
+learned from a corpus of MIDI files.
+
+Counts for every context length up to the model order live in a single
+fixed size hashed table, so memory doesn't grow with the corpus; each slot
+also stores a fingerprint of its n-gram, so n-grams that hash to the same
+slot don't share counts. Corpus files are read in parallel worker
+processes, a batch at a time.
+"""
+import json
+import os
+import random
+import sys
+from array import array
+from collections import Counter, deque
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool
+from typing import Iterable, List
+
+import mido
+
+from midigen.keys import Key
+from midigen.notes import Note
+
+
+# durations are quantized to 16th notes, up to a whole note
+DURATION_STEPS = 16
+STEPS_PER_BEAT = 4
+
+_MAGIC = b'midigen-ngram\n'
+# 2: fingerprints are saved after the counts
+_FORMAT = 2
+_MAX_COUNT = 2 ** 32 - 1
+# slots tried after an n-gram's own slot is taken by another n-gram
+_MAX_PROBES = 32
+_FNV_OFFSET = 0xcbf29ce484222325
+_FNV_PRIME = 0x100000001b3
+
+
+def midi_files(root: str):
+    """
+    Paths of all MIDI files below a directory, generated lazily
+    """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(('.mid', '.midi')):
+                yield os.path.join(dirpath, filename)
+
+
+def read_notes(filename: str):
+    """
+    (note, duration in steps) sequences for every track of a MIDI file,
+    ordered by onset; drums (channel 10) are skipped
+    """
+    mid = mido.MidiFile(filename)
+    step_ticks = mid.ticks_per_beat / STEPS_PER_BEAT
+    sequences = []
+    for track in mid.tracks:
+        tick = 0
+        open_notes = {}
+        notes = []
+        for msg in track:
+            tick += msg.time
+            if msg.type not in ('note_on', 'note_off') or msg.channel == 9:
+                continue
+            if msg.type == 'note_on' and msg.velocity > 0:
+                notes.append([tick, msg.note, 1])
+                open_notes.setdefault((msg.channel, msg.note), deque()).append(notes[-1])
+            elif open_notes.get((msg.channel, msg.note)):
+                note = open_notes[(msg.channel, msg.note)].popleft()
+                note[2] = min(DURATION_STEPS, max(1, round((tick - note[0]) / step_ticks)))
+
+        if notes:
+            sequences.append([(note, steps) for _, note, steps in sorted(notes)])
+    return sequences
+
+
+def _fnv(tokens: Iterable[int]):
+    h = _FNV_OFFSET
+    for token in tokens:
+        h = ((h ^ (token & 0xffff)) * _FNV_PRIME) & 0xffffffffffffffff
+    return h
+
+
+# counting is done by module level functions that only need the model's
+# settings, so worker processes aren't sent the count table
+
+
+def _token(note: int, steps: int, durations: bool):
+    return note * (DURATION_STEPS + 1) + steps if durations else note
+
+
+def _ngram_hash(context: tuple, token: int):
+    # the context length is hashed too, so orders don't collide; the low
+    # bits pick the slot and the high 32 bits are the fingerprint
+    return _fnv((len(context), *context, token))
+
+
+def _fingerprint(ngram_hash: int):
+    # 0 marks an empty slot
+    return (ngram_hash >> 32) or 1
+
+
+def _count_sequence(tokens: List[int], order: int):
+    ngrams = Counter()
+    for i, token in enumerate(tokens):
+        for k in range(min(i, order) + 1):
+            ngrams[_ngram_hash(tuple(tokens[i - k:i]), token)] += 1
+    return ngrams
+
+
+def _count_file(filename: str, order: int, durations: bool):
+    ngrams = Counter()
+    for sequence in read_notes(filename):
+        ngrams.update(_count_sequence(
+            [_token(note, steps, durations) for note, steps in sequence],
+            order
+        ))
+    return ngrams
+
+
+def _count_file_or_skip(filename: str, order: int, durations: bool):
+    try:
+        return _count_file(filename, order, durations)
+    except (OSError, ValueError, EOFError, KeyError):
+        return None
+
+
+class NgramModel:
+    """
+    Order-k Markov model over note tokens (note and duration, with
+    durations=True); counts for contexts of every length up to `order` are
+    kept so generation can back off to shorter contexts. The table has
+    2 ** table_bits slots; once the slots near an n-gram's own are all
+    taken, further new n-grams are not counted (see self.dropped)
+    """
+    def __init__(
+        self,
+        order: int = 2,
+        durations: bool = False,
+        table_bits: int = 20
+    ):
+        self.order = order
+        self.durations = durations
+        self.table_bits = table_bits
+        self.counts = array('I', bytes(4 << table_bits))
+        self.fingerprints = array('I', bytes(4 << table_bits))
+        self.files = 0
+        # distinct n-grams that found no free slot
+        self.dropped = 0
+
+    def token(self, note: int, steps: int = 1):
+        return _token(note, steps, self.durations)
+
+    def decode(self, token: int):
+        """
+        (note, duration in steps) for a token; duration is None without
+        durations
+        """
+        if self.durations:
+            return divmod(token, DURATION_STEPS + 1)
+        return token, None
+
+    def count_sequence(self, tokens: List[int]):
+        """
+        Hashed n-gram counts of one token sequence, as {n-gram hash: count}
+        """
+        return _count_sequence(tokens, self.order)
+
+    def count_file(self, filename: str):
+        return _count_file(filename, self.order, self.durations)
+
+    def _find(self, ngram_hash: int, insert: bool = False):
+        """
+        The slot of an n-gram (linear probing from its hashed slot), or None
+        if it isn't in the table; with insert, claim a free slot for it
+        """
+        fingerprint = _fingerprint(ngram_hash)
+        mask = (1 << self.table_bits) - 1
+        for probe in range(_MAX_PROBES):
+            slot = (ngram_hash + probe) & mask
+            found = self.fingerprints[slot]
+            if found == fingerprint:
+                return slot
+            if not found:
+                if insert:
+                    self.fingerprints[slot] = fingerprint
+                    return slot
+                return None
+        return None
+
+    def add_counts(self, ngrams: dict):
+        for ngram_hash, count in ngrams.items():
+            slot = self._find(ngram_hash, insert=True)
+            if slot is None:
+                self.dropped += 1
+            else:
+                self.counts[slot] = min(_MAX_COUNT, self.counts[slot] + count)
+
+    def train(
+        self,
+        filenames: Iterable[str],
+        processes: int = None,
+        batch_size: int = 256
+    ):
+        """
+        Count the n-grams of every file; files are read by a pool of worker
+        processes (or in this process with processes=0), one batch at a time
+        so memory stays bounded however many files there are. Unreadable
+        files are skipped; returns the number of files skipped.
+        """
+        filenames = iter(filenames)
+        count = partial(
+            _count_file_or_skip,
+            order=self.order,
+            durations=self.durations
+        )
+        skipped = 0
+        pool = Pool(processes) if processes != 0 else None
+        try:
+            while batch := list(islice(filenames, batch_size)):
+                results = (
+                    pool.imap_unordered(count, batch, chunksize=8)
+                    if pool else map(count, batch)
+                )
+                for ngrams in results:
+                    if ngrams is None:
+                        skipped += 1
+                    else:
+                        self.add_counts(ngrams)
+                        self.files += 1
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        return skipped
+
+    def count(self, context: tuple, token: int):
+        slot = self._find(_ngram_hash(tuple(context), token))
+        return 0 if slot is None else self.counts[slot]
+
+    def weights(self, context: tuple, candidates: List[int]):
+        """
+        Counts of each candidate after the longest suffix of `context` (up to
+        the model order) that has been seen with any candidate
+        """
+        context = tuple(context)[-self.order:] if self.order else ()
+        for k in range(len(context), -1, -1):
+            suffix = context[len(context) - k:]
+            weights = [self.count(suffix, token) for token in candidates]
+            if any(weights):
+                return weights
+        return [1] * len(candidates)
+
+    def candidates(self, notes: List[int]):
+        if self.durations:
+            return [
+                self.token(note, steps)
+                for note in notes
+                for steps in range(1, DURATION_STEPS + 1)
+            ]
+        return list(notes)
+
+    def generate_sequence(
+        self,
+        length: int = 16,
+        notes: List[int] = range(128),
+        context: List[int] = ()
+    ):
+        """
+        Sample `length` tokens drawn from `notes`, continuing from `context`
+        (a list of earlier tokens)
+        """
+        candidates = self.candidates(notes)
+        context = list(context)
+        sequence = []
+        for _ in range(length):
+            token = random.choices(
+                candidates,
+                weights=self.weights(context, candidates)
+            )[0]
+            sequence.append(token)
+            context.append(token)
+        return sequence
+
+    def sequences_for_keys(
+        self,
+        keys: List[Key],
+        notes_per_key: int = 8,
+        min_note: int = Note.C.value_for_octave(3),
+        max_note: int = Note.C.value_for_octave(5),
+    ):
+        """
+        Note sequences for a chord progression, restricted to the notes of
+        each key in the given range; each sequence continues from the last
+        """
+        sequences = []
+        context = []
+        for key in keys:
+            pitch_classes = {note.value % 12 for note in key.notes}
+            tokens = self.generate_sequence(
+                notes_per_key,
+                [
+                    n for n in range(min_note, max_note + 1)
+                    if n % 12 in pitch_classes
+                ],
+                context
+            )
+            context = (context + tokens)[-self.order:] if self.order else []
+            sequences.append([self.decode(token)[0] for token in tokens])
+        return sequences
+
+    def save(self, filename: str):
+        with open(filename, 'wb') as fh:
+            fh.write(_MAGIC)
+            fh.write(json.dumps({
+                'format': _FORMAT,
+                'order': self.order,
+                'durations': self.durations,
+                'table_bits': self.table_bits,
+                'files': self.files,
+                'dropped': self.dropped,
+                'byteorder': sys.byteorder,
+            }).encode() + b'\n')
+            self.counts.tofile(fh)
+            self.fingerprints.tofile(fh)
+
+    @staticmethod
+    def load(filename: str):
+        with open(filename, 'rb') as fh:
+            if fh.readline() != _MAGIC:
+                raise ValueError(f'{filename} is not a midigen n-gram model')
+            header = json.loads(fh.readline())
+            if header.get('format') != _FORMAT:
+                raise ValueError(f'{filename} was saved by an older midigen; train it again')
+            model = NgramModel(
+                header['order'],
+                header['durations'],
+                header['table_bits']
+            )
+            model.files = header['files']
+            model.dropped = header['dropped']
+            model.counts = array('I')
+            model.counts.fromfile(fh, 1 << model.table_bits)
+            model.fingerprints = array('I')
+            model.fingerprints.fromfile(fh, 1 << model.table_bits)
+            if header['byteorder'] != sys.byteorder:
+                model.counts.byteswap()
+                model.fingerprints.byteswap()
+        return model
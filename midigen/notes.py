@@ -25,9 +25,7 @@ class Note(Enum):
     B = 71
 
     def __add__(self, offset: int):
-        for note in Note:
-            if (note.value) % 12 == (self.value + offset) % 12:
-                return note
+        return _PITCH_CLASSES[(self.value + offset) % 12]
 
     def __sub__(self, offset: int):
         return self + (-offset)
@@ -38,4 +36,8 @@ class Note(Enum):
 
     @staticmethod
     def from_value(value: int):
-        return list(Note)[value % 12]
+        return _PITCH_CLASSES[value % 12]
+
+
+# pitch class -> Note, without the flat aliases
+_PITCH_CLASSES = sorted(Note, key=lambda note: note.value % 12)
@@ -0,0 +1,324 @@
+"""
+Single clock playback: the messages of every track are converted to
+absolute send times up front, merged into one schedule and sent from a
+single thread or coroutine, so tracks can't drift against each other.
+"""
+import asyncio
+import heapq
+import time
+from array import array
+from math import ceil
+from operator import itemgetter
+from threading import Event, Thread
+from typing import List, TYPE_CHECKING
+
+from mido import Message, bpm2tempo
+from mido.ports import BaseOutput
+
+from midigen.events import to_mido
+from midigen.time import TICKS_PER_BEAT
+
+if TYPE_CHECKING:
+    from midigen.sequencer import Track
+
+
+# time.sleep can overshoot by a scheduler quantum, so the last part of
+# every wait is spent busy-waiting instead
+SPIN_SECS = 0.002
+
+
+def seconds_per_tick(tempo: int):
+    return bpm2tempo(tempo) * 1e-6 / TICKS_PER_BEAT
+
+
+def track_schedule(track: 'Track', tempo: int = 90):
+    """
+    (send time in seconds, mido message) pairs for a track, with the
+    track's channel already applied; precomputed, except for streaming
+    tracks, so messages are built before they are due
+    """
+    scale = seconds_per_tick(tempo)
+    schedule = (
+        (msg.time * scale, to_mido(msg.copy(channel=track.channel)))
+        for msg in track.iter_messages()
+    )
+    return schedule if track.streaming else list(schedule)
+
+
+class TimingReport:
+    """
+    Lateness of every message sent during playback, i.e. how long after
+    its due time port.send was called, in seconds
+    """
+    def __init__(self, late_secs: float = 0.001):
+        self.late_secs = late_secs
+        self.lateness = array('d')
+        self.dropped = 0
+
+    def record(self, lateness: float):
+        self.lateness.append(lateness)
+
+    def __len__(self):
+        return len(self.lateness)
+
+    def percentile(self, pct: float):
+        if not self.lateness:
+            return 0.0
+        ordered = sorted(self.lateness)
+        rank = max(0, ceil(pct / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    @property
+    def max(self):
+        return max(self.lateness, default=0.0)
+
+    @property
+    def late(self):
+        """
+        Number of messages sent more than late_secs after their due time
+        """
+        return sum(1 for lateness in self.lateness if lateness > self.late_secs)
+
+    def summary(self):
+        return {
+            'sent': len(self),
+            'dropped': self.dropped,
+            'late': self.late,
+            'p50_ms': self.p50 * 1000,
+            'p99_ms': self.p99 * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+    def __repr__(self):
+        return (
+            f'{len(self)} sent, {self.dropped} dropped, {self.late} late; '
+            f'lateness p50 {self.p50 * 1000:.3f}ms, '
+            f'p99 {self.p99 * 1000:.3f}ms, max {self.max * 1000:.3f}ms'
+        )
+
+
+def sleep_until(deadline: float):
+    while (remaining := deadline - time.perf_counter()) > SPIN_SECS:
+        time.sleep(remaining - SPIN_SECS)
+    while time.perf_counter() < deadline:
+        pass
+
+
+class Player:
+    """
+    Plays any number of tracks on one port, either from a single scheduler
+    thread (start / join) or as a coroutine on an asyncio event loop
+    (run_async). Playback can be paused, resumed and stopped; notes that
+    are sounding are released when playback pauses or stops.
+
+    With record_timing, the lateness of every message is kept in
+    self.report (a TimingReport); on_timing(msg, due, lateness) is called
+    after each send. note_ons more than drop_late_secs late are skipped
+    and counted as dropped.
+    """
+    def __init__(
+        self,
+        tracks: List['Track'],
+        port: BaseOutput,
+        tempo: int = 90,
+        play_to_end: bool = False,
+        record_timing: bool = False,
+        on_timing: callable = None,
+        drop_late_secs: float = None
+    ):
+        self.port = port
+        self.report = TimingReport() if record_timing else None
+        self.on_timing = on_timing
+        self.drop_late_secs = drop_late_secs
+        self.schedules = [track_schedule(t, tempo) for t in tracks]
+        # optionally keep the clock running until the longest track is over
+        self._end_tracks = tracks if play_to_end else []
+        self._seconds_per_tick = seconds_per_tick(tempo)
+        self.thread = None
+        self._tstart = None
+        self._paused_at = None
+        self._stopped = False
+        self._active_notes = set()
+        # wakes the scheduler thread early on pause / resume / stop
+        self._interrupt = Event()
+        # the same for run_async, with the loop it runs on
+        self._interrupt_async = None
+        self._loop = None
+
+    @property
+    def duration_secs(self):
+        # streaming tracks only know their duration once they are played out
+        return max(
+            [t.duration_ticks for t in self._end_tracks],
+            default=0
+        ) * self._seconds_per_tick
+
+    def schedule(self):
+        """
+        All tracks' messages, merged in send time order
+        """
+        return heapq.merge(*self.schedules, key=itemgetter(0))
+
+    @property
+    def paused(self):
+        return self._paused_at is not None
+
+    def pause(self):
+        if not self.paused:
+            self._paused_at = time.perf_counter()
+            self._wake()
+        return self
+
+    def resume(self):
+        if self.paused:
+            if self._tstart is not None:
+                self._tstart += time.perf_counter() - self._paused_at
+            self._paused_at = None
+            self._wake()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._wake()
+        return self
+
+    def _wake(self):
+        self._interrupt.set()
+        # read once: run_async may finish on another thread meanwhile
+        loop, interrupt = self._loop, self._interrupt_async
+        if interrupt is not None and loop is not None and not loop.is_closed():
+            # asyncio events aren't thread safe; pause etc. may be called
+            # from another thread
+            loop.call_soon_threadsafe(interrupt.set)
+
+    def _dispatch(self, due: float, msg):
+        """
+        Send a message that is due `due` seconds into playback
+        """
+        instrumented = (
+            self.report is not None or
+            self.on_timing is not None or
+            self.drop_late_secs is not None
+        )
+        if not instrumented:
+            self._send(msg)
+            return
+
+        lateness = time.perf_counter() - self._tstart - due
+        if (
+            self.drop_late_secs is not None and
+            lateness > self.drop_late_secs and
+            msg.type == 'note_on'
+        ):
+            if self.report is not None:
+                self.report.dropped += 1
+            return
+
+        self._send(msg)
+        if self.report is not None:
+            self.report.record(lateness)
+        if self.on_timing is not None:
+            self.on_timing(msg, due, lateness)
+
+    def _send(self, msg):
+        if msg.type == 'note_on' and msg.velocity > 0:
+            self._active_notes.add((msg.channel, msg.note))
+        elif msg.type in ('note_on', 'note_off'):
+            self._active_notes.discard((msg.channel, msg.note))
+        self.port.send(msg)
+
+    def _silence(self):
+        for channel, note in sorted(self._active_notes):
+            self.port.send(Message('note_off', channel=channel, note=note))
+        self._active_notes.clear()
+
+    def _begin(self):
+        self._tstart = time.perf_counter()
+        if self._paused_at is not None:
+            self._paused_at = self._tstart
+
+    def _wait(self, due: float):
+        """
+        Block until `due` seconds into playback; False if stopped
+        """
+        while not self._stopped:
+            if self.paused:
+                self._silence()
+                self._interrupt.wait()
+                self._interrupt.clear()
+                continue
+            remaining = self._tstart + due - time.perf_counter()
+            if remaining > SPIN_SECS:
+                self._interrupt.wait(remaining - SPIN_SECS)
+                self._interrupt.clear()
+            else:
+                sleep_until(self._tstart + due)
+                return True
+        return False
+
+    async def _wait_async(self, due: float):
+        while not self._stopped:
+            if self.paused:
+                self._silence()
+                await self._interrupt_async.wait()
+                self._interrupt_async.clear()
+                continue
+            remaining = self._tstart + due - time.perf_counter()
+            if remaining <= 0:
+                return True
+            try:
+                await asyncio.wait_for(self._interrupt_async.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+            self._interrupt_async.clear()
+        return False
+
+    def run(self):
+        self._begin()
+        try:
+            for due, msg in self.schedule():
+                if not self._wait(due):
+                    return
+                self._dispatch(due, msg)
+
+            self._wait(self.duration_secs)
+        finally:
+            self._silence()
+
+    async def run_async(self):
+        """
+        Play on the running event loop; cancelling the task stops playback
+        """
+        self._loop = asyncio.get_running_loop()
+        self._interrupt_async = asyncio.Event()
+        self._begin()
+        try:
+            for due, msg in self.schedule():
+                if not await self._wait_async(due):
+                    return
+                self._dispatch(due, msg)
+
+            await self._wait_async(self.duration_secs)
+        finally:
+            self._silence()
+            # the loop may be closed by now; later pause / stop calls only
+            # need to wake a scheduler thread
+            self._interrupt_async = self._loop = None
+
+    def start(self):
+        self.thread = Thread(target=self.run)
+        self.thread.start()
+        return self
+
+    def join(self):
+        if self.thread is not None:
+            self.thread.join()
+        return self
@@ -0,0 +1,96 @@
+"""
+Per-stage profiling for the midigen CLI: wall time (exclusive of nested
+stages), call counts and peak memory for each named stage, plus an
+optional cProfile dump. Stages cost nothing but a function call unless
+profiling is on.
+"""
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+_NOT_PROFILING = nullcontext()
+_profiler = None
+
+
+class Profiler:
+    def __init__(self):
+        # name -> [calls, exclusive seconds, peak bytes above the start]
+        self.stages = {}
+        # [children's seconds, traced bytes at the start, peak bytes so
+        # far] for each open stage
+        self._open = []
+
+    @contextmanager
+    def stage(self, name: str):
+        if self._open:
+            # the peak is reset for this stage; keep the parent's so far
+            parent = self._open[-1]
+            parent[2] = max(parent[2], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        mem_start = tracemalloc.get_traced_memory()[0]
+        self._open.append([0.0, mem_start, mem_start])
+        tstart = time.perf_counter()
+        try:
+            yield
+        finally:
+            secs = time.perf_counter() - tstart
+            child_secs, mem_start, peak = self._open.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            stats = self.stages.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += secs - child_secs
+            stats[2] = max(stats[2], peak - mem_start)
+            if self._open:
+                self._open[-1][0] += secs
+                self._open[-1][2] = max(self._open[-1][2], peak)
+
+    def report(self):
+        """
+        Calls, exclusive time and the highest peak of traced memory above
+        the memory in use when the stage started (including nested stages)
+        """
+        lines = [f'{"stage":<12} {"calls":>7} {"time (s)":>10} {"peak (KiB)":>12}']
+        for name, (calls, secs, peak) in sorted(
+            self.stages.items(),
+            key=lambda item: -item[1][1]
+        ):
+            lines.append(f'{name:<12} {calls:>7} {secs:>10.4f} {peak / 1024:>12.1f}')
+        stats = self.stages.values()
+        lines.append(
+            f'{"total":<12} {sum(s[0] for s in stats):>7} '
+            f'{sum(s[1] for s in stats):>10.4f} '
+            f'{max((s[2] for s in stats), default=0) / 1024:>12.1f}'
+        )
+        return '\n'.join(lines)
+
+
+def stage(name: str):
+    """
+    Context manager that attributes the enclosed work to a named stage
+    """
+    if _profiler is None:
+        return _NOT_PROFILING
+    return _profiler.stage(name)
+
+
+@contextmanager
+def profile(dump_file: str = None):
+    """
+    Profile the stages run in this context; with dump_file, also run
+    cProfile and write its stats there (for pstats / snakeviz)
+    """
+    global _profiler
+    _profiler = profiler = Profiler()
+    profiler_c = cProfile.Profile() if dump_file else None
+    tracemalloc.start()
+    if profiler_c:
+        profiler_c.enable()
+    try:
+        yield profiler
+    finally:
+        if profiler_c:
+            profiler_c.disable()
+            profiler_c.dump_stats(dump_file)
+        tracemalloc.stop()
+        _profiler = None
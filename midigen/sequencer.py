@@ -1,31 +1,46 @@
+import heapq
 import time
-from threading import Thread
-from typing import List
+from itertools import chain, count
+from typing import BinaryIO, Iterable, List, TYPE_CHECKING
 
+from midigen.events import Event, to_mido
+from midigen.midifile import write_midi
+from midigen.time import Measure, TimeSignature
 
-import mido
-from mido import Message, MetaMessage, MidiFile, MidiTrack
-from mido import tick2second, bpm2tempo
-from mido.ports import BaseOutput
-
-from midigen.time import Measure, TimeSignature, TICKS_PER_BEAT
+# mido is only imported when a song is written or played
+if TYPE_CHECKING:
+    from mido.ports import BaseOutput
 
 
 class Track:
+    # streaming tracks generate their messages as they are consumed
+    streaming = False
+
     def __init__(
         self,
         name: str = 'midigen',
         duration_ticks: int = 0,
-        messages: List[Message] = [],
+        messages: List[Event] = [],
         channel: int = 0,
         program: int = 0
     ):
         self.name = name
         self.duration_ticks = duration_ticks
-        self.messages = sorted(messages, key=lambda m: m.time)
+        self.messages = messages
         self.channel = channel
         self.program = program
 
+    @property
+    def messages(self):
+        return self.materialize()._messages
+
+    @messages.setter
+    def messages(self, messages: List[Event]):
+        self._messages = sorted(messages, key=lambda m: m.time)
+        # list of (offset_ticks, segment) pieces, where a segment is either
+        # a sorted message list or a nested tuple of pieces
+        self._pieces = ((0, self._messages),)
+
     @staticmethod
     def from_measures(
         measures: List[Measure],
@@ -35,47 +50,110 @@ class Track:
         stack: bool = False
     ):
         t = Track(name=name, channel=channel, program=program)
+        pieces = []
         for measure in measures:
-            merge_method = t.stack if stack else t.append
-            t = merge_method(Track(
+            piece = Track(
                 name,
                 measure.duration_ticks,
                 measure.messages,
                 channel,
                 program
-            ))
+            )
+            if stack:
+                pieces.append((0, piece._pieces))
+                t.duration_ticks = max(t.duration_ticks, piece.duration_ticks)
+            else:
+                pieces.append((t.duration_ticks, piece._pieces))
+                t.duration_ticks += piece.duration_ticks
+
+        t._set_pieces(tuple(pieces))
         return t
 
-    def play(self, port: BaseOutput, tempo: int = 90, block: bool = False):
-        def play():
-            tstart = time.time()
-            for msg in self.messages:
-                msg_time_secs = tick2second(
-                    msg.time,
-                    TICKS_PER_BEAT,
-                    bpm2tempo(tempo)
+    @staticmethod
+    def from_measure_stream(
+        measures: Iterable[Measure],
+        channel: int = 0,
+        program: int = 0,
+        name: str = 'midigen'
+    ):
+        """
+        A track that pulls measures from an iterator (possibly endless) only
+        as it is played or written; see StreamingTrack
+        """
+        return StreamingTrack(measures, name, channel, program)
+
+    def _set_pieces(self, pieces: tuple):
+        self._pieces = pieces
+        self._messages = None
+
+    def _segments(self):
+        """
+        Yield the (offset_ticks, messages) leaves of the piece tree, in order
+        """
+        stack = [(0, self._pieces)]
+        while stack:
+            offset, segment = stack.pop()
+            if isinstance(segment, tuple):
+                stack.extend(
+                    (offset + piece_offset, piece)
+                    for piece_offset, piece in reversed(segment)
                 )
-                while (dt := msg_time_secs - (time.time() - tstart)) > 0:
-                    time.sleep(dt)
-
-                port.send(msg.copy(channel=self.channel))
-
-        t = Thread(target=play)
-        t.start()
+            else:
+                yield offset, segment
+
+    def materialize(self):
+        """
+        Flatten the pieces appended to this track into a single sorted
+        message list
+        """
+        if self._messages is None:
+            self._messages = sorted(
+                [
+                    msg.copy(time=msg.time + offset) if offset else msg
+                    for offset, messages in self._segments()
+                    for msg in messages
+                ],
+                key=lambda m: m.time
+            )
+            self._pieces = ((0, self._messages),)
+        return self
+
+    def to_columnar(self):
+        """
+        Convert to a numpy backed ColumnarTrack (requires numpy)
+        """
+        from midigen.columnar import ColumnarTrack
+        return ColumnarTrack.from_track(self)
+
+    def player(self, port: 'BaseOutput', tempo: int = 90, **options):
+        """
+        A Player for this track; options are passed through to Player
+        (record_timing, on_timing, drop_late_secs)
+        """
+        # playback (threads, asyncio) is only loaded when something is played
+        from midigen.playback import Player
+        return Player([self], port, tempo, **options)
+
+    def play(self, port: 'BaseOutput', tempo: int = 90, block: bool = False, **options):
+        player = self.player(port, tempo, **options).start()
         if block:
-            t.join()
+            player.join()
+        return player
+
+    async def play_async(self, port: 'BaseOutput', tempo: int = 90, **options):
+        player = self.player(port, tempo, **options)
+        await player.run_async()
+        return player
 
     def shift_time(self, offs_ticks: int):
-        return Track(
+        t = Track(
             name=self.name,
             duration_ticks=self.duration_ticks,
-            messages=[
-                msg.copy(time=msg.time + offs_ticks)
-                for msg in self.messages
-            ],
             channel=self.channel,
             program=self.program
         )
+        t._set_pieces(((offs_ticks, self._pieces),))
+        return t
 
     def shift_pitch(self, offs: int):
         return Track(
@@ -90,83 +168,248 @@ class Track:
         )
 
     def append(self, other: 'Track'):
-        shifted = other.shift_time(self.duration_ticks)
-        return Track(
-            self.name,
-            self.duration_ticks + other.duration_ticks,
-            self.messages + shifted.messages,
-            channel=self.channel,
-            program=self.program
-        )
+        if other.streaming:
+            return StreamingTrack(
+                _measures_of(self),
+                self.name,
+                self.channel,
+                self.program
+            ).append(other)
+        return Track.string_tracks([self, other])
 
     def stack(self, other: 'Track'):
-        return Track(
+        t = Track(
             self.name,
             max(self.duration_ticks, other.duration_ticks),
-            self.messages + other.messages,
             channel=self.channel,
             program=self.program
         )
+        t._set_pieces(((0, self._pieces), (0, other._pieces)))
+        return t
 
     def loop(self, n: int):
         return Track.string_tracks([self] * n)
 
     @staticmethod
     def string_tracks(tracks: List['Track']):
-        t = tracks[0]
-        for track in tracks[1:]:
-            t = t.append(track)
+        first = tracks[0]
+        t = Track(
+            first.name,
+            channel=first.channel,
+            program=first.program
+        )
+        pieces = []
+        for track in tracks:
+            pieces.append((t.duration_ticks, track._pieces))
+            t.duration_ticks += track.duration_ticks
 
+        t._set_pieces(tuple(pieces))
         return t
 
-    def to_midi_track(self):
-        track = MidiTrack()
-        track.append(MetaMessage('track_name', name=self.name))
-        track.append(Message(
+    def iter_messages(self):
+        """
+        Messages in time order with absolute times; unlike `messages`, the
+        pieces of the track are merged on the fly instead of flattened
+        """
+        if self._messages is not None:
+            return iter(self._messages)
+
+        return heapq.merge(
+            *[
+                _shifted(messages, offset)
+                for offset, messages in self._segments()
+            ],
+            key=lambda m: m.time
+        )
+
+    def iter_midi_messages(self):
+        """
+        The messages of this track's MIDI file chunk, with delta times,
+        generated one at a time
+        """
+        from mido import Message, MetaMessage
+
+        yield MetaMessage('track_name', name=self.name)
+        yield Message(
             'program_change',
             channel=self.channel,
             program=self.program
-        ))
-        sorted_msgs = sorted(
-            [m.copy(channel=self.channel) for m in self.messages],
-            key=lambda msg: msg.time
         )
         # convert timestamps to deltas
-        tlast = sorted_msgs[0].time
-        for msg in sorted_msgs:
+        tlast = None
+        for msg in self.iter_messages():
+            if tlast is None:
+                tlast = msg.time
             # make sure swing or other randomization hasn't moved notes out of bounds
             if 0 <= msg.time <= self.duration_ticks:
-                track.append(
-                    msg.copy(
-                        time=msg.time - tlast
-                    )
+                yield msg.copy(
+                    channel=self.channel,
+                    time=msg.time - tlast
                 )
                 tlast = msg.time
 
-        track.append(MetaMessage('end_of_track', time=self.duration_ticks - tlast))
-        return track
+        yield MetaMessage('end_of_track', time=self.duration_ticks - (tlast or 0))
+
+    def to_midi_track(self):
+        from mido import MidiTrack
+        return MidiTrack(to_mido(msg) for msg in self.iter_midi_messages())
 
-    def to_midi(self, name: str):
-        Song([self]).to_midi(name)
+    def to_midi(self, name: str, file: BinaryIO = None):
+        Song([self]).to_midi(name, file=file)
+
+
+def _shifted(messages: List[Event], offset: int):
+    for msg in messages:
+        yield msg.copy(time=msg.time + offset) if offset else msg
+
+
+class StreamingTrack(Track):
+    """
+    Track whose measures are pulled from an iterator while it is played or
+    written, buffering at most one measure ahead, so memory stays constant
+    however long the stream runs. Measures must not contain negative
+    message times. A streaming track can only be consumed once;
+    duration_ticks grows as measures are pulled. shift_pitch, shift_time
+    (later only) and append transform the stream lazily; stack and loop
+    need a materialize()d track.
+    """
+    streaming = True
+
+    def __init__(
+        self,
+        measures: Iterable[Measure],
+        name: str = 'midigen',
+        channel: int = 0,
+        program: int = 0
+    ):
+        self.name = name
+        self.duration_ticks = 0
+        self.channel = channel
+        self.program = program
+        self._measures = iter(measures)
+
+    @property
+    def messages(self):
+        return list(self.iter_messages())
+
+    def materialize(self):
+        return Track(
+            self.name,
+            messages=self.messages,
+            duration_ticks=self.duration_ticks,
+            channel=self.channel,
+            program=self.program
+        )
+
+    def iter_messages(self):
+        pending = []
+        order = count()
+        for measure in self._measures:
+            # nothing in this (or a later) measure can come before its start
+            offset = self.duration_ticks
+            while pending and pending[0][0] < offset:
+                yield heapq.heappop(pending)[2]
+
+            self.duration_ticks += measure.duration_ticks
+            for msg in sorted(measure.messages, key=lambda m: m.time):
+                heapq.heappush(pending, (
+                    msg.time + offset,
+                    next(order),
+                    msg.copy(time=msg.time + offset)
+                ))
+
+        while pending:
+            yield heapq.heappop(pending)[2]
+
+    @property
+    def _pieces(self):
+        # reached from stack / string_tracks on a regular track
+        raise TypeError(
+            'streaming tracks can only be appended to other tracks; '
+            'materialize() them to stack or loop them'
+        )
+
+    def _map_measures(self, transform: callable):
+        return StreamingTrack(
+            (transform(measure) for measure in self._measures),
+            self.name,
+            self.channel,
+            self.program
+        )
+
+    def shift_time(self, offs_ticks: int):
+        if offs_ticks < 0:
+            # messages would move before the start of their measure
+            raise ValueError('streaming tracks can only be shifted later in time')
+        return self._map_measures(lambda measure: _with_messages(measure, [
+            msg.copy(time=msg.time + offs_ticks) for msg in measure.messages
+        ]))
+
+    def shift_pitch(self, offs: int):
+        return self._map_measures(lambda measure: _with_messages(measure, [
+            msg.copy(note=msg.note + offs) for msg in measure.messages
+        ]))
+
+    def append(self, other: Track):
+        """
+        A streaming track that plays this stream and then `other`
+        """
+        return StreamingTrack(
+            chain(self._measures, _measures_of(other)),
+            self.name,
+            self.channel,
+            self.program
+        )
+
+    def stack(self, other: Track):
+        raise TypeError('streaming tracks can\'t be stacked; materialize() them first')
+
+    def loop(self, n: int):
+        raise TypeError('streaming tracks are consumed once and can\'t be looped')
+
+    def to_columnar(self):
+        return self.materialize().to_columnar()
+
+
+def _with_messages(measure: Measure, messages: List[Event]):
+    """
+    A copy of a measure with other messages; the duration is kept, as
+    pseudo measures from _measures_of don't follow their time signature
+    """
+    copy = Measure(measure.time_signature, messages)
+    copy.duration_ticks = measure.duration_ticks
+    return copy
+
+
+def _measures_of(track: Track):
+    """
+    The measures of a streaming track, or a regular track as one measure
+    """
+    if track.streaming:
+        return track._measures
+    measure = Measure(messages=track.messages)
+    measure.duration_ticks = track.duration_ticks
+    return [measure]
 
 
 class Song:
     def __init__(self, tracks: List[Track] = []):
         self.tracks = tracks
 
-    def play(self, port: BaseOutput, tempo: int = 90, block: bool = True):
-        for i, track in enumerate(self.tracks):
-            track.play(port, tempo)
+    def player(self, port: 'BaseOutput', tempo: int = 90, **options):
+        from midigen.playback import Player
+        return Player(self.tracks, port, tempo, play_to_end=True, **options)
 
+    def play(self, port: 'BaseOutput', tempo: int = 90, block: bool = True, **options):
+        player = self.player(port, tempo, **options).start()
         if block:
-            time.sleep(max([
-                tick2second(
-                    t.duration_ticks,
-                    TICKS_PER_BEAT,
-                    bpm2tempo(tempo)
-                )
-                for t in self.tracks
-            ]))
+            player.join()
+        return player
+
+    async def play_async(self, port: 'BaseOutput', tempo: int = 90, **options):
+        player = self.player(port, tempo, **options)
+        await player.run_async()
+        return player
 
     def loop(self, n: int):
         return Song([t.loop(n) for t in self.tracks])
@@ -175,28 +418,43 @@ class Song:
         self,
         name: str = 'midigen',
         tempo: int = 90,
-        time_signature: TimeSignature = TimeSignature(4, 4)
+        time_signature: TimeSignature = TimeSignature(4, 4),
+        file: BinaryIO = None
     ):
-        mid = MidiFile()
-        mid.tracks.append(MidiTrack([
-            MetaMessage('track_name', name=name),
-            MetaMessage('set_tempo', tempo=bpm2tempo(tempo)),
-            MetaMessage(
-                'time_signature',
-                numerator=time_signature.numerator,
-                denominator=time_signature.denominator
-            )
-        ]))
+        """
+        Write the song to a MIDI file named `name`, or to `file` (any binary
+        stream) if given; tracks are streamed out one chunk at a time
+        """
+        from mido import MetaMessage, bpm2tempo
+
+        tracks = [
+            [
+                MetaMessage('track_name', name=name),
+                MetaMessage('set_tempo', tempo=bpm2tempo(tempo)),
+                MetaMessage(
+                    'time_signature',
+                    numerator=time_signature.numerator,
+                    denominator=time_signature.denominator
+                )
+            ]
+        ] + [
+            track.iter_midi_messages()
+            for track in sorted(self.tracks, key=lambda t: t.channel)
+        ]
 
-        for track in sorted(self.tracks, key=lambda t: t.channel):
-            mid.tracks.append(track.to_midi_track())
-        mid.save(name)
+        if file is not None:
+            write_midi(file, tracks)
+        else:
+            with open(name, 'wb') as fh:
+                write_midi(fh, tracks)
 
 
 def play_notes(notes, port, tempo: float = 90, velocity: int = 90):
     """
     Simple function to play a list of notes on a given port.
     """
+    from mido import Message
+
     spacing_secs = 60 / tempo
 
     for note in notes:
@@ -217,4 +475,5 @@ def play_notes(notes, port, tempo: float = 90, velocity: int = 90):
 
 
 def open_output(name: str = 'midigen'):
+    import mido
     return mido.open_output(name, virtual=True)
@@ -1,6 +1,8 @@
+from collections import deque
+from functools import lru_cache
 from typing import List
 
-from mido import Message
+from midigen.events import Event, FrozenEvent
 
 
 TICKS_PER_BEAT = 480
@@ -20,15 +22,40 @@ class Measure:
     def __init__(
         self,
         time_signature: TimeSignature = TimeSignature(4, 4),
-        messages: List[Message] = []
+        messages: List[Event] = []
     ):
         self.time_signature = time_signature
         self.messages = messages
         self.duration_ticks = TICKS_PER_BEAT * time_signature.numerator
 
+    @property
+    def messages(self):
+        return self._messages
+
+    @messages.setter
+    def messages(self, messages: List[Event]):
+        self._messages = messages
+        self._note_pairs = None
+
+    def note_pairs(self):
+        """
+        (note_on, note_off) pairs and remaining non-note messages; computed
+        once per measure, see pair_notes
+        """
+        if self._note_pairs is None:
+            self._note_pairs = pair_notes(self.messages)
+        return self._note_pairs
+
     def mutate(self, msg_mutator: callable):
         return msg_mutator(self)
 
+    def to_columnar(self):
+        """
+        Convert to a numpy backed ColumnarMeasure (requires numpy)
+        """
+        from midigen.columnar import ColumnarMeasure
+        return ColumnarMeasure.from_measure(self)
+
     @staticmethod
     def from_pattern(
         pattern: List[List[int]],
@@ -38,32 +65,84 @@ class Measure:
     ):
         """
         Generate a one measure sequence of notes; the pattern
-        is a list of notes to play at each beat
+        is a list of notes to play at each beat. Measures are stamped from
+        cached templates: their messages are a tuple of frozen events
+        shared by every measure with the same pattern (mutators copy them)
         """
-        # ensure pattern is a multiple of the time signature
-        assert len(pattern) % time_signature.numerator == 0
-        step = time_signature.numerator / len(pattern) * TICKS_PER_BEAT
-
-        return Measure(
-            time_signature=time_signature,
-            messages=[
-                msg
-                for i, notes in enumerate(pattern)
-                if notes
-                for note in (notes if isinstance(notes, list) else [notes])
-                for msg in [
-                    Message(
-                        'note_on',
-                        note=note,
-                        velocity=velocity,
-                        time=int(i * step)
-                    ),
-                    Message(
-                        'note_off',
-                        note=note,
-                        velocity=velocity,
-                        time=int((i + duration) * step)
-                    )
-                ]
-            ]
+        messages, note_pairs = _pattern_template(
+            tuple(
+                tuple(notes) if isinstance(notes, list) else notes
+                for notes in pattern
+            ),
+            time_signature.numerator,
+            time_signature.denominator,
+            velocity,
+            duration
         )
+        measure = Measure(time_signature=time_signature, messages=messages)
+        measure._note_pairs = note_pairs
+        return measure
+
+
+@lru_cache(maxsize=1024)
+def _pattern_template(
+    pattern: tuple,
+    numerator: int,
+    denominator: int,
+    velocity: int,
+    duration: float
+):
+    """
+    (messages, note pairs) of a pattern measure, see Measure.from_pattern
+    """
+    # ensure pattern is a multiple of the time signature
+    assert len(pattern) % numerator == 0
+    step = numerator / len(pattern) * TICKS_PER_BEAT
+
+    messages = tuple(
+        msg
+        for i, notes in enumerate(pattern)
+        if notes
+        for note in (notes if isinstance(notes, tuple) else [notes])
+        for msg in [
+            FrozenEvent(
+                'note_on',
+                note=note,
+                velocity=velocity,
+                time=int(i * step)
+            ),
+            FrozenEvent(
+                'note_off',
+                note=note,
+                velocity=velocity,
+                time=int((i + duration) * step)
+            )
+        ]
+    )
+    return messages, pair_notes(messages)
+
+
+def pair_notes(messages: List[Event]):
+    """
+    Match each note_on with the oldest open note_off of the same channel and
+    note. Returns (pairs, others): pairs is a tuple of (note_on, note_off)
+    tuples in time order, with note_off None for notes that are never
+    released, and others holds the non-note messages. Orphaned note_offs
+    are left out.
+    """
+    pairs = []
+    others = []
+    open_notes = {}
+    for msg in sorted(messages, key=lambda m: m.time):
+        if msg.type == 'note_on':
+            pair = [msg, None]
+            pairs.append(pair)
+            open_notes.setdefault((msg.channel, msg.note), deque()).append(pair)
+        elif msg.type == 'note_off':
+            waiting = open_notes.get((msg.channel, msg.note))
+            if waiting:
+                waiting.popleft()[1] = msg
+        else:
+            others.append(msg)
+
+    return tuple(tuple(pair) for pair in pairs), tuple(others)
@@ -0,0 +1,137 @@
+import pytest
+
+from midigen import rhythm
+from midigen.sequencer import Track
+
+pytest.importorskip('numpy')
+
+from midigen.columnar import ColumnarMeasure, ColumnarTrack  # noqa: E402
+
+
+def test_columnar_round_trip():
+    track = Track.from_measures([
+        rhythm.four_on_the_floor(),
+        rhythm.son_clave(),
+    ])
+    columnar = track.to_columnar()
+    assert len(columnar) == len(track.messages)
+    assert columnar.messages == track.messages
+    assert columnar.to_midi_track() == track.to_midi_track()
+
+    measures = [rhythm.son_clave(), rhythm.straight_8ths()]
+    for stack in (False, True):
+        assert ColumnarTrack.from_measures(measures, stack=stack).messages == \
+            Track.from_measures(measures, stack=stack).messages
+
+
+def test_columnar_transforms_match_track():
+    track = Track.from_measures([rhythm.son_clave(), rhythm.straight_8ths()])
+    hats = Track.from_measures([rhythm.straight_16ths()])
+    columnar = track.to_columnar()
+
+    for expected, actual in (
+        (track.shift_time(7), columnar.shift_time(7)),
+        (track.shift_pitch(-12), columnar.shift_pitch(-12)),
+        (track.stack(hats), columnar.stack(hats)),
+        (track.append(hats), columnar.append(hats)),
+        (track.loop(3), columnar.loop(3)),
+    ):
+        assert actual.duration_ticks == expected.duration_ticks
+        assert actual.messages == expected.messages
+
+
+def test_vectorized_humanize_matches_per_measure():
+    from midigen import columnar, humanize
+
+    measures = [rhythm.straight_8ths(), rhythm.son_clave()] * 4
+    track = ColumnarTrack.from_measures(measures)
+
+    for vectorized, per_measure in (
+        (columnar.swing(track, 0.2), [humanize.swing(m, 0.2) for m in measures]),
+        (columnar.pulse(track, 0.5), [humanize.pulse(m, 0.5) for m in measures]),
+    ):
+        assert vectorized.messages == Track.from_measures(per_measure).messages
+
+
+def test_note_pairs_handles_chords_and_orphans():
+    from mido import Message
+    from midigen import columnar
+
+    track = ColumnarTrack.from_track(Track(messages=[
+        Message('note_off', note=62, time=0),  # orphan
+        Message('note_on', note=60, time=0),
+        Message('note_on', note=64, time=0),
+        Message('note_off', note=64, time=10),
+        Message('note_off', note=60, time=20),
+        Message('note_on', note=67, time=30),
+    ]))
+    on_index, off_index = columnar.note_pairs(track)
+    pairs = {
+        track.columns['note'][on]: (track.columns['tick'][on], track.columns['tick'][off] if off >= 0 else None)
+        for on, off in zip(on_index, off_index)
+    }
+    assert pairs == {60: (0, 20), 64: (0, 10), 67: (30, None)}
+
+    dropped = columnar.dropout(track, 0)
+    assert len(dropped) == 5
+    assert len(columnar.dropout(track, 1)) == 0
+
+
+def test_vectorized_randomize_keeps_pairs_together():
+    from midigen import columnar
+
+    track = ColumnarTrack.from_measures([rhythm.straight_16ths()] * 16)
+    randomized = columnar.randomize_time(track, 0.1, rng=1)
+    assert len(randomized) == len(track)
+    ons = randomized.columns['type'] == 1
+    durations = randomized.columns['tick'][~ons] - randomized.columns['tick'][ons]
+    assert (durations >= 0).all()
+
+    assert columnar.randomize_time(track, 0.1, rng=1).messages == randomized.messages
+
+    velocities = columnar.randomize_velocity(track, 0.5, rng=2).columns['velocity']
+    assert velocities.min() >= 0 and velocities.max() <= 127
+
+
+def test_columnar_shift_pitch_checks_range():
+    from midigen.time import Measure
+
+    track = ColumnarTrack.from_measures([Measure.from_pattern([120] * 4)])
+    with pytest.raises(ValueError):
+        track.shift_pitch(12)
+
+
+def _events(measure):
+    # mutators may order events with the same time differently
+    return sorted(msg._fields() for msg in measure.messages)
+
+
+def test_columnar_measures():
+    from midigen import columnar, humanize
+    from midigen.time import Measure, TimeSignature
+
+    measures = [
+        rhythm.son_clave(),
+        rhythm.straight_8ths(),
+        Measure.from_pattern([[60, 64], None, [67]], TimeSignature(3, 4)),
+    ]
+    converted = [m.to_columnar() for m in measures]
+    for measure, columnar_measure in zip(measures, converted):
+        assert isinstance(columnar_measure, ColumnarMeasure)
+        assert columnar_measure.duration_ticks == measure.duration_ticks
+        assert columnar_measure.messages == sorted(measure.messages, key=lambda m: m.time)
+        assert columnar_measure.to_measure().messages == columnar_measure.messages
+
+        # vectorized mutators return columnar measures
+        swung = columnar.swing(columnar_measure, 0.2)
+        assert isinstance(swung, ColumnarMeasure)
+        assert _events(swung) == _events(humanize.swing(measure, 0.2))
+        assert _events(columnar.pulse(columnar_measure, 0.5)) == _events(humanize.pulse(measure, 0.5))
+        assert len(columnar.dropout(columnar_measure, 0.5, rng=1)) % 2 == 0
+
+        # and the per-event mutators still apply
+        assert humanize.dropout(columnar_measure, 0).messages == columnar_measure.messages
+
+    for stack in (False, True):
+        assert ColumnarTrack.from_measures(converted, stack=stack).messages == \
+            Track.from_measures(measures, stack=stack).messages
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+from mido import Message
+
+from midigen import humanize, rhythm
+from midigen.events import Event, to_mido
+from midigen.sequencer import Song, Track
+from midigen.time import Measure
+
+
+def test_event_copy_and_conversion():
+    event = Event('note_on', note=60, velocity=90, channel=2, time=10)
+    moved = event.copy(time=20, note=62)
+    assert (event.time, event.note) == (10, 60)
+    assert (moved.time, moved.note, moved.velocity, moved.channel) == (20, 62, 90, 2)
+
+    msg = event.to_mido()
+    assert msg == Message('note_on', note=60, velocity=90, channel=2, time=10)
+    assert event == msg and Event.from_mido(msg) == event
+    assert to_mido(msg) is msg
+    assert event.bytes() == msg.bytes()
+
+    with pytest.raises(AttributeError):
+        event.copy(pitch=1)
+    with pytest.raises(ValueError):
+        Event('control_change')
+
+
+def test_mido_messages_are_still_accepted():
+    events = rhythm.son_clave().messages
+    messages = [event.to_mido() for event in events]
+
+    written = []
+    for measure in (Measure(messages=events), Measure(messages=messages)):
+        measure = humanize.swing(humanize.pulse(measure, 0.2), 0.1)
+        file = io.BytesIO()
+        Song([Track.from_measures([measure], channel=9)]).to_midi('m', file=file)
+        written.append(file.getvalue())
+
+    assert written[0] == written[1]
+
+
+def test_out_of_range_values_are_not_written():
+    track = Track.from_measures([Measure.from_pattern([120] * 4)]).shift_pitch(12)
+    with pytest.raises(ValueError):
+        Song([track]).to_midi('m', file=io.BytesIO())
+
+    loud = Track(
+        messages=[msg.copy(velocity=200) for msg in rhythm.son_clave().messages],
+        duration_ticks=1920
+    )
+    with pytest.raises(ValueError):
+        Song([loud]).to_midi('m', file=io.BytesIO())
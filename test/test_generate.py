@@ -0,0 +1,110 @@
+import json
+
+from midigen import generate
+
+
+def test_batch_matches_single_renders(tmp_path):
+    jobs = [
+        {
+            'key': key,
+            'chords': 'ii V7 Imaj7 vi',
+            'tempo': 100,
+            'loop': 2,
+            'seed': seed,
+            'output': str(tmp_path / f'b-{key}.mid'),
+        }
+        for key, seed in (('C', 1), ('G', 2))
+    ]
+    # 0 is a value, not a missing field
+    jobs[1].update(swing=0, randomize=0)
+    jobs.append({'chords': 'I', 'output': str(tmp_path / 'missing' / 'x.mid')})
+    manifest = tmp_path / 'jobs.json'
+    manifest.write_text(json.dumps(jobs))
+
+    assert generate.main(['batch', str(manifest), '--jobs', '2']) == 1
+
+    for job in jobs[:2]:
+        single = job['output'].replace('/b-', '/s-')
+        generate.main([
+            '--key', job['key'],
+            '--chords', *job['chords'].split(),
+            '--tempo', str(job['tempo']),
+            '--loop', str(job['loop']),
+            '--seed', str(job['seed']),
+            '--swing', str(job.get('swing', 0.03)),
+            '--randomize', str(job.get('randomize', 0.001)),
+            '--output', single,
+        ])
+        with open(single, 'rb') as a, open(job['output'], 'rb') as b:
+            # the output name is also written as the song's track name
+            assert a.read().replace(b'/s-', b'/b-') == b.read()
+
+
+def test_startup_is_fast_and_lazy():
+    import subprocess
+    import sys
+    import time
+
+    tstart = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'midigen.generate', '--help'], check=True, capture_output=True)
+    # generous bound; a cold start takes ~0.25s
+    assert time.perf_counter() - tstart < 2
+
+    # mido, playback, ports and the batch pool are only loaded when used
+    loaded = subprocess.run(
+        [
+            sys.executable, '-c',
+            'import sys, midigen.generate; print(sorted(set(sys.modules) & {'
+            '"mido", "asyncio", "pkg_resources", "rtmidi", "midigen.playback", "concurrent.futures.process"}))'
+        ],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    assert loaded.strip() == '[]'
+
+
+def test_profile_reports_stages(tmp_path, capsys):
+    import pstats
+    from midigen import profiling
+
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    generate.main([
+        '-c', 'ii', 'V7', 'I', '-l', '2', '--seed', '1',
+        '-o', str(tmp_path / 'a' / 'out.mid'),
+        '--profile', '--profile-dump', str(tmp_path / 'p.prof'),
+    ])
+    report = capsys.readouterr().err
+    for stage in ('beat', 'bass', 'chords', 'melody', 'humanize', 'graphs', 'to_midi', 'total'):
+        assert stage in report
+    assert 'humanize' in report.split('\n', 1)[1]
+    assert pstats.Stats(str(tmp_path / 'p.prof')).total_calls > 0
+    # profiling is off again afterwards
+    assert profiling.stage('x') is profiling.stage('y')
+
+    generate.main(['-c', 'ii', 'V7', 'I', '-l', '2', '--seed', '1', '-o', str(tmp_path / 'b' / 'out.mid')])
+    assert capsys.readouterr().err == ''
+    # the track name is the output path
+    assert (tmp_path / 'a' / 'out.mid').read_bytes().replace(b'/a/', b'/b/') == \
+        (tmp_path / 'b' / 'out.mid').read_bytes()
+
+
+def test_profile_peak_memory():
+    from midigen import profiling
+
+    assert 'total' in profiling.Profiler().report()
+
+    data = list(range(200000))
+    with profiling.profile() as profiler:
+        with profiling.stage('outer'):
+            with profiling.stage('alloc'):
+                temporary = list(range(200000))
+                del temporary
+            with profiling.stage('free'):
+                del data
+    calls, secs, peak = profiler.stages['alloc']
+    assert peak > 200000 * 8
+    assert profiler.stages['outer'][2] >= peak
+    assert profiler.stages['free'][2] >= 0
+    assert '-' not in profiler.report()
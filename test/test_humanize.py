@@ -1,5 +1,10 @@
+import random
+from collections import Counter
+
 from midigen import humanize
 from midigen import rhythm
+from midigen.events import Event
+from midigen.time import Measure
 
 
 def test_pulse():
@@ -32,3 +37,54 @@ def test_pulse():
         ).messages
         if msg.type == 'note_on'
     ] == [0, 37, 127, 37, 0, 37, 127, 37]
+
+
+def _crossed_notes():
+    """
+    A chord whose note_offs come in the opposite order of its note_ons,
+    then a note struck again before it is released
+    """
+    return Measure(messages=[
+        Event('note_on', 60, time=480),
+        Event('note_on', 64, time=480),
+        Event('note_on', 67, time=480),
+        Event('note_off', 67, time=600),
+        Event('note_off', 64, time=700),
+        Event('note_off', 60, time=800),
+        Event('note_on', 72, time=960),
+        Event('note_on', 72, time=1100),
+        Event('note_off', 72, time=1200),
+        Event('note_off', 72, time=1300),
+    ])
+
+
+def _notes(measure, type):
+    return Counter(msg.note for msg in measure.messages if msg.type == type)
+
+
+def test_dropout_keeps_chord_pairs_together():
+    chords = Measure.from_pattern([[60, 64, 67], None, [62, 65, 69], None])
+    for seed in range(50):
+        random.seed(seed)
+        for measure in (humanize.randomize_time(chords, 0.05), _crossed_notes()):
+            dropped = humanize.dropout(measure, 0.5)
+            # every surviving note_on kept its own note_off
+            assert _notes(dropped, 'note_on') == _notes(dropped, 'note_off')
+            assert all(any(msg is m for m in measure.messages) for msg in dropped.messages)
+
+
+def test_randomize_time_shifts_pairs_together():
+    measure = _crossed_notes()
+    for seed in range(50):
+        random.seed(seed)
+        randomized = humanize.randomize_time(measure, 0.02)
+        assert _notes(randomized, 'note_on') == _notes(measure, 'note_on')
+        assert _notes(randomized, 'note_off') == _notes(measure, 'note_off')
+
+        def times(type, note):
+            return sorted(msg.time for msg in randomized.messages if msg.type == type and msg.note == note)
+
+        for note, durations in ((60, [320]), (64, [220]), (67, [120]), (72, [240, 200])):
+            assert [
+                off - on for on, off in zip(times('note_on', note), times('note_off', note))
+            ] == durations
@@ -60,3 +60,81 @@ def test_chord_parser():
         ('C9', Key(Note.C, Mode.Major).chord([7, 9])),
     ):
         assert Key.parse_chord(text) == expected
+
+
+def test_match_voicing_matches_exhaustive_search():
+    from itertools import product
+
+    def exhaustive(notes, voicing):
+        return min(
+            [[n + o for n, o in zip(notes, offsets)] for offsets in product([-12, 0, 12], repeat=len(notes))],
+            key=lambda v: sum(abs(n - m) for n, m in product(v, voicing))
+        )
+
+    for chord in ('C', 'Dm7', 'G7', 'Am9', 'Fmaj13', 'Bb11'):
+        key, ext = Key.parse(chord)
+        extensions = list(range(7, int(ext or '5') + 1, 2))
+        for voicing in ([60, 64, 67], [48, 55], [62], [43, 59, 74], [55, 67]):
+            assert key.chord(extensions, match_voicing=voicing) == \
+                exhaustive(key.chord(extensions), voicing)
+
+
+def test_voice_progression_minimizes_movement():
+    from midigen.keys import voice_progression, _movement
+
+    keys = [Key.parse(chord)[0] for chord in ('ii', 'V', 'I', 'vi', 'IV', 'V', 'iii', 'vi')] * 4
+    extensions = [[7, 9]] * len(keys)
+    voicings = voice_progression(keys, extensions)
+
+    assert len(voicings) == len(keys)
+    for key, ext, voicing in zip(keys, extensions, voicings):
+        assert sorted(n % 12 for n in voicing) == sorted(n % 12 for n in key.chord(ext))
+
+    def total(voicings):
+        return sum(_movement(tuple(a), tuple(b)) for a, b in zip(voicings, voicings[1:]))
+
+    independent = [
+        key.chord(ext, match_voicing=keys[0].triad())
+        for key, ext in zip(keys, extensions)
+    ]
+    assert total(voicings) < total(independent)
+    assert voice_progression([]) == []
+
+
+def test_lookup_tables_match_enum_search():
+    for note in Note:
+        for offset in range(-24, 25):
+            assert note + offset == next(n for n in Note if n.value % 12 == (note.value + offset) % 12)
+    for value in range(128):
+        assert Note.from_value(value) == list(Note)[value % 12]
+    for mode in Mode:
+        for offset in range(-8, 9):
+            assert mode + offset == next((m for m in Mode if m.value % 8 == (mode.value + offset) % 8), None)
+
+
+def test_keys_are_interned():
+    import pickle
+
+    key = Key(Note.C, Mode.Major)
+    assert Key(Note.C, Mode.Ionian) is key
+    assert key.relative_key(6) is Key(Note.A, Mode.Minor)
+    assert pickle.loads(pickle.dumps(key)) is key
+    assert len({key, Key(Note.A, Mode.Aeolian), Key(Note.D, Mode.Major)}) == 2
+
+
+def test_parse_is_cached():
+    from midigen.keys import _parse_symbol
+
+    assert Key.parse('Ebmaj7') is Key.parse('Ebmaj7')
+    assert Key.parse('Ebmaj7') == _parse_symbol.__wrapped__('Ebmaj7')
+
+    def parsed(symbol):
+        key, ext = Key.parse(symbol)
+        return key.key, key.mode, ext
+
+    assert parsed('Ebmaj7') == (Note.Eb, Mode.Major, '7')
+    assert parsed('ii7') == (Note.D, Mode.Dorian, '7')
+    assert parsed('Gsus13') == (Note.G, Mode.Major, '13')
+    assert [key for key, ext in Key.parse_many(['V7', 'Imaj7', 'V7'])] == [
+        Key(Note.G, Mode.Mixolydian), Key(Note.C, Mode.Major), Key(Note.G, Mode.Mixolydian)
+    ]
@@ -0,0 +1,198 @@
+import random
+from collections import Counter
+
+import pytest
+
+from midigen.markov import AliasTable, Graph
+from midigen.keys import Key, Mode
+from midigen.notes import Note
+
+
+def test_alias_table_distribution():
+    random.seed(0)
+    table = AliasTable(['a', 'b', 'c', 'd'], [1, 2, 3, 0])
+    counts = Counter(table.sample() for _ in range(60000))
+    assert counts['d'] == 0
+    for item, weight in (('a', 1), ('b', 2), ('c', 3)):
+        assert abs(counts[item] / 60000 - weight / 6) < 0.01
+
+
+def test_compiled_transitions_follow_weight_changes():
+    graph = Graph(
+        min_note=Note.C.value_for_octave(3),
+        max_note=Note.C.value_for_octave(4),
+    ).compile()
+    start = graph.nodes[0]
+    target = graph.nodes[-1]
+    assert {start.next() for _ in range(200)} != {target}
+
+    graph.clear_weights()
+    for edge in start.edges:
+        if edge.node2 is target:
+            edge.weight = 1
+    assert {start.next() for _ in range(200)} == {target}
+    assert graph.generate_sequence(2, start.value) == [start.value, target.value]
+
+
+def test_interval_bounded_graph():
+    dense = Graph()
+    sparse = Graph(max_interval=7)
+    assert 0 < len(sparse.edges) < len(dense.edges) / 3
+    assert all(abs(e.node1.value - e.node2.value) <= 7 for e in sparse.edges)
+
+    def weights(graph):
+        return sorted(
+            (e.node1.value, e.node2.value, e.weight)
+            for e in graph.edges
+        )
+
+    assert weights(sparse) == [
+        w for w in weights(dense)
+        if abs(w[0] - w[1]) <= 7
+    ]
+
+    sparse.strengthen_connections([(Note.C, Note.G)], 5)
+    boosted = [
+        e for e in sparse.edges
+        if e.node1.value % 12 == 0 and e.node2.value % 12 == 7
+    ]
+    assert boosted and all(e.weight > 5 for e in boosted)
+
+    sequence = sparse.generate_sequence(64)
+    assert all(abs(a - b) <= 7 for a, b in zip(sequence, sequence[1:]))
+    assert len(sparse.sequences_for_keys([Key(Note.D, Mode.Dorian)] * 2, 8)) == 2
+
+
+def test_sequences_for_keys_builds_one_graph_per_key(monkeypatch):
+    from midigen import markov
+
+    graph = Graph(
+        min_note=Note.C.value_for_octave(3),
+        max_note=Note.C.value_for_octave(5),
+    )
+    built = []
+    original_init = markov.Graph.__init__
+
+    def counting_init(self, *args, **kwargs):
+        built.append(args[0] if args else kwargs.get('key'))
+        original_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(markov.Graph, '__init__', counting_init)
+
+    key = Key(Note.C, Mode.Major)
+    progression = [key.relative_key(d) for d in (2, 5, 1, 6)] * 25
+    sequences = graph.sequences_for_keys(progression, 8)
+    assert len(sequences) == 100
+    assert len(built) == 4
+
+    graph.sequences_for_keys(progression, 8)
+    assert len(built) == 4
+
+    # changing weights invalidates the derived graphs
+    graph.strengthen_connections([(Note.C, Note.G)], 2)
+    graph.sequences_for_keys(progression, 8)
+    assert len(built) == 8
+
+
+def test_indexed_strengthen_matches_scan():
+    pairs = [(Note.D, Note.C), (Note.B, Note.G), (Note.Db, Note.C)]
+    indexed = Graph().strengthen_connections(pairs, 3)
+
+    scanned = Graph()
+    for n1, n2 in pairs:
+        for edge in scanned.edges:
+            if (
+                Note.from_value(edge.node1.value) == n1 and
+                Note.from_value(edge.node2.value) == n2 and
+                abs(edge.node1.value - edge.node2.value) <= 12
+            ):
+                edge.weight += 3
+    assert [e.weight for e in indexed.edges] == [e.weight for e in scanned.edges]
+
+    bias = [[0] * 12 for _ in range(12)]
+    bias[2][0] = bias[11][7] = 3
+    bulk = Graph().strengthen_pitch_classes(bias)
+    assert [e.weight for e in bulk.edges] == [
+        e.weight for e in Graph().strengthen_connections(pairs[:2], 3).edges
+    ]
+
+
+def test_generate_sequences_batched_and_seeded():
+    np = pytest.importorskip('numpy')
+
+    graph = Graph(
+        min_note=Note.C.value_for_octave(3),
+        max_note=Note.C.value_for_octave(5),
+        max_interval=5,
+    )
+    random.seed(3)
+    state = random.getstate()
+    walks = graph.generate_sequences(500, 12, start_note=Note.E.value, seed=7)
+    assert random.getstate() == state
+    assert walks.shape == (500, 12)
+    assert (walks[:, 0] == Note.E.value).all()
+    assert np.array_equal(walks, graph.generate_sequences(500, 12, Note.E.value, seed=7))
+
+    # every step follows an edge, with roughly the edge weight's probability
+    node = next(n for n in graph.nodes if n.value == Note.E.value)
+    total = sum(e.weight for e in node.edges)
+    expected = Counter()
+    for edge in node.edges:
+        expected[edge.node2.value] += edge.weight / total
+    observed = Counter(walks[:, 1].tolist())
+    assert set(observed) <= set(expected)
+    for value, p in expected.items():
+        assert abs(observed[value] / 500 - p) < 0.08
+
+    followed = graph.follow_sequences([60, 62, 64, 66], 10, seed=1)
+    assert followed.shape == (10, 4)
+    assert (followed[:, 0] == 65).all()
+
+    assert graph.generate_sequences(3, 1, seed=0).shape == (3, 1)
+    with pytest.raises(ValueError, match='at least one note'):
+        graph.generate_sequences(3, 0)
+    with pytest.raises(ValueError, match='sequence to continue'):
+        graph.follow_sequences([], 3)
+
+
+def test_one_edge_per_connection():
+    graph = Graph(min_note=Note.C.value_for_octave(3), max_note=Note.C.value_for_octave(4))
+    n = len(graph.nodes)
+    assert len(graph.edges) == n * (n - 1)
+    assert all(len(node.edges) == n - 1 for node in graph.nodes)
+
+    # edge_weights follow the order of graph.edges
+    weights = [float(i) for i in range(1, len(graph.edges) + 1)]
+    rebuilt = Graph(
+        min_note=Note.C.value_for_octave(3),
+        max_note=Note.C.value_for_octave(4),
+        edge_weights=weights
+    )
+    assert [e.weight for e in rebuilt.edges] == weights
+
+    with pytest.raises(IndexError):
+        Graph(edge_weights=[1.0])
+
+
+def test_max_interval_without_connections():
+    with pytest.raises(ValueError, match='max_interval=4 leaves note'):
+        Graph(degrees=[1, 5], max_interval=4)
+
+
+def test_derived_graphs_keep_weights_by_position():
+    graph = Graph(
+        min_note=Note.E.value_for_octave(0),
+        max_note=Note.E.value_for_octave(2),
+        degrees=[1, 5]
+    ).strengthen_connections([(Note.G, Note.C)], 5)
+    derived = graph._derive(Key(Note.E))
+    # E0 is in range for E but C0 isn't for C
+    assert len(derived.nodes) == len(graph.nodes) + 1
+
+    weights = graph._edges_by_position()
+    for position, edge in derived._edges_by_position().items():
+        if position in weights:
+            assert edge.weight == weights[position].weight
+        else:
+            assert edge.weight == 1 / (abs(edge.node1.value - edge.node2.value) + 1)
+    assert len(graph.sequences_for_keys([Key(Note.E), Key(Note.A, Mode.Minor)], 4)) == 2
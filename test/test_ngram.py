@@ -0,0 +1,110 @@
+from midigen.keys import Key, Mode
+from midigen.notes import Note
+from midigen.ngram import NgramModel, midi_files, read_notes
+
+
+def _corpus(tmp_path, n=4):
+    scale = Key(Note.C, Mode.Major).to_track()
+    for i in range(n):
+        (tmp_path / str(i % 2)).mkdir(exist_ok=True)
+        scale.to_midi(str(tmp_path / str(i % 2) / f'scale{i}.mid'))
+    (tmp_path / 'broken.mid').write_bytes(b'not midi')
+    return tmp_path
+
+
+def test_read_notes(tmp_path):
+    filename = next(midi_files(_corpus(tmp_path, 1) / '0'))
+    (sequence,) = read_notes(filename)
+    assert [note for note, steps in sequence] == [60, 62, 64, 65, 67, 69, 71, 72]
+
+
+def test_train_in_parallel_matches_serial(tmp_path):
+    corpus = _corpus(tmp_path)
+    serial, parallel = NgramModel(2, table_bits=12), NgramModel(2, table_bits=12)
+    assert serial.train(midi_files(corpus), processes=0, batch_size=3) == 1
+    assert parallel.train(midi_files(corpus), processes=2) == 1
+    assert serial.files == parallel.files == 4
+    # files finish in any order in parallel, which can change the layout
+    assert sorted(zip(serial.fingerprints, serial.counts)) == \
+        sorted(zip(parallel.fingerprints, parallel.counts))
+    assert serial.count((60, 62), 64) == 4
+    assert serial.count((), 60) == 4
+
+
+def test_generation_and_save_load(tmp_path):
+    model = NgramModel(2, durations=True, table_bits=12)
+    model.train(midi_files(_corpus(tmp_path)), processes=0)
+    model.save(str(tmp_path / 'model.ngram'))
+    loaded = NgramModel.load(str(tmp_path / 'model.ngram'))
+    assert (loaded.order, loaded.durations, loaded.files) == (2, True, 4)
+    assert loaded.counts == model.counts
+    assert loaded.fingerprints == model.fingerprints
+
+    # the only continuation seen after C D is E, then F...
+    start = [model.token(60, 4), model.token(62, 4)]
+    tokens = loaded.generate_sequence(5, range(60, 73), start)
+    notes = [loaded.decode(token)[0] for token in tokens]
+    assert notes == [64, 65, 67, 69, 71]
+    assert {loaded.decode(token)[1] for token in tokens} == {4}
+
+    (seq,) = loaded.sequences_for_keys([Key(Note.C, Mode.Major)], 4)
+    assert all(n % 12 in (0, 2, 4, 5, 7, 9, 11) for n in seq)
+
+
+def test_workers_are_not_sent_the_count_table(tmp_path, monkeypatch):
+    import pickle
+    from midigen import ngram
+
+    sizes = []
+
+    class RecordingPool:
+        def __init__(self, processes):
+            pass
+
+        def imap_unordered(self, func, iterable, chunksize=1):
+            sizes.append(len(pickle.dumps(func)))
+            return map(func, iterable)
+
+        def close(self):
+            pass
+
+        def join(self):
+            pass
+
+    monkeypatch.setattr(ngram, 'Pool', RecordingPool)
+    model = NgramModel(2)
+    model.train(midi_files(_corpus(tmp_path)))
+    assert model.files == 4
+    assert sizes and max(sizes) < 1024
+
+
+def test_unseen_ngrams_count_zero_in_a_loaded_table():
+    import random
+    from collections import Counter
+
+    rng = random.Random(0)
+    model = NgramModel(1, table_bits=12)
+    seen = Counter()
+    # about 2000 distinct bigrams and unigrams: half the table's slots
+    while len(seen) < 2000:
+        tokens = [rng.randrange(60) for _ in range(32)]
+        model.add_counts(model.count_sequence(tokens))
+        seen.update(((), token) for token in tokens)
+        seen.update(((a,), b) for a, b in zip(tokens, tokens[1:]))
+    assert model.dropped == 0
+
+    for context, token in seen:
+        assert model.count(context, token) == seen[(context, token)]
+    unseen = [
+        ((a,), b)
+        for a in range(60, 120)
+        for b in range(128)
+    ] + [((a,), b) for a in range(60) for b in range(60) if ((a,), b) not in seen]
+    assert all(model.count(context, token) == 0 for context, token in unseen)
+
+
+def test_full_table_drops_new_ngrams():
+    model = NgramModel(0, table_bits=4)
+    model.add_counts(model.count_sequence(list(range(40))))
+    assert model.dropped == 40 - 16
+    assert sum(model.count((), token) for token in range(40)) == 16
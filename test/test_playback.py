@@ -0,0 +1,191 @@
+import time
+
+from midigen import rhythm
+from midigen.sequencer import Song, Track
+
+
+class RecordingPort:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append((time.perf_counter(), msg))
+
+
+def test_song_play_merges_tracks_on_one_clock():
+    tempo = 3000  # 20ms per beat
+    kick = Track.from_measures([rhythm.four_on_the_floor()], channel=9)
+    hats = Track.from_measures([rhythm.straight_16ths()], channel=1)
+    port = RecordingPort()
+
+    tstart = time.perf_counter()
+    Song([kick, hats]).play(port, tempo)
+    elapsed = time.perf_counter() - tstart
+
+    assert len(port.sent) == len(kick.messages) + len(hats.messages)
+    assert elapsed >= 4 * 0.02
+    sent_ticks = [msg.time for _, msg in port.sent]
+    assert sent_ticks == sorted(sent_ticks)
+    assert {msg.channel for _, msg in port.sent} == {1, 9}
+
+    # kick and hats share downbeats; they go out back to back
+    downbeats = [t for t, msg in port.sent if msg.time == 0]
+    assert max(downbeats) - min(downbeats) < 0.01
+
+
+def test_play_async_concurrent_songs():
+    import asyncio
+
+    tempo = 3000
+    songs = [
+        Song([Track.from_measures([rhythm.four_on_the_floor()], channel=i)])
+        for i in range(4)
+    ]
+    ports = [RecordingPort() for _ in songs]
+
+    async def play_all():
+        await asyncio.gather(*[
+            song.play_async(port, tempo)
+            for song, port in zip(songs, ports)
+        ])
+
+    tstart = time.perf_counter()
+    asyncio.run(play_all())
+    assert time.perf_counter() - tstart < 4 * 4 * 0.02
+    for channel, (song, port) in enumerate(zip(songs, ports)):
+        assert [msg for _, msg in port.sent] == [
+            msg.copy(channel=channel).to_mido() for msg in song.tracks[0].messages
+        ]
+
+
+def test_pause_resume_and_cancel():
+    import asyncio
+
+    tempo = 3000
+    song = Song([Track.from_measures([rhythm.straight_8ths()] * 4)])
+    port = RecordingPort()
+
+    async def play():
+        player = song.player(port, tempo)
+        task = asyncio.create_task(player.run_async())
+        await asyncio.sleep(0.05)
+        player.pause()
+        await asyncio.sleep(0.01)
+        sent_while_paused = len(port.sent)
+        await asyncio.sleep(0.05)
+        assert len(port.sent) == sent_while_paused
+        # sounding notes are released on pause
+        assert port.sent[-1][1].type == 'note_off'
+
+        player.resume()
+        await asyncio.sleep(0.05)
+        assert len(port.sent) > sent_while_paused
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return len(port.sent)
+
+    sent = asyncio.run(play())
+    assert 0 < sent < len(song.tracks[0].messages)
+
+    ons = sum(1 for _, msg in port.sent if msg.type == 'note_on')
+    offs = sum(1 for _, msg in port.sent if msg.type == 'note_off')
+    assert offs >= ons
+
+
+def test_timing_report():
+    from midigen.playback import TimingReport
+
+    tempo = 3000
+    song = Song([Track.from_measures([rhythm.straight_16ths()])])
+    seen = []
+    player = song.play(
+        RecordingPort(),
+        tempo,
+        record_timing=True,
+        on_timing=lambda msg, due, lateness: seen.append(lateness)
+    )
+    report = player.report
+    assert len(report) == len(seen) == len(song.tracks[0].messages)
+    assert report.dropped == 0
+    assert 0 <= report.p50 <= report.p99 <= report.max
+    assert report.summary()['sent'] == len(report)
+
+    report = TimingReport(late_secs=0.001)
+    for lateness in (0.0, 0.0005, 0.002, 0.01):
+        report.record(lateness)
+    assert report.p50 == 0.0005
+    assert report.p99 == report.max == 0.01
+    assert report.late == 2
+
+
+def test_play_endless_stream():
+    from itertools import islice, repeat
+
+    tempo = 3000
+    stream = Track.from_measure_stream(repeat(rhythm.four_on_the_floor()))
+    player = Song([stream]).player(RecordingPort(), tempo).start()
+    time.sleep(0.2)
+    player.stop().join()
+    sent = len(player.port.sent)
+    assert sent > 8
+
+    finite = Track.from_measure_stream(islice(repeat(rhythm.four_on_the_floor()), 2))
+    port = RecordingPort()
+    Song([finite]).play(port, tempo)
+    assert len(port.sent) == 16
+
+
+def test_schedule_holds_prebuilt_mido_messages():
+    from mido import Message
+    from midigen.playback import track_schedule
+
+    track = Track.from_measures([rhythm.son_clave()], channel=3)
+    schedule = track_schedule(track, 120)
+    assert all(type(msg) is Message and msg.channel == 3 for _, msg in schedule)
+
+
+def test_async_pause_and_stop_take_effect_between_events():
+    import asyncio
+    from midigen.time import Measure
+
+    # one whole note per bar: 2s between events at 120 bpm
+    song = Song([Track.from_measures([Measure.from_pattern([[60], None, None, None], duration=3.9)] * 2)])
+    port = RecordingPort()
+
+    async def play():
+        player = song.player(port, 120)
+        task = asyncio.create_task(player.run_async())
+        await asyncio.sleep(0.05)
+        assert [msg.type for _, msg in port.sent] == ['note_on']
+
+        tpause = time.perf_counter()
+        player.pause()
+        await asyncio.sleep(0.05)
+        assert [msg.type for _, msg in port.sent] == ['note_on', 'note_off']
+        assert port.sent[-1][0] - tpause < 0.05
+
+        tstop = time.perf_counter()
+        player.stop()
+        await asyncio.wait_for(task, 0.5)
+        return time.perf_counter() - tstop
+
+    assert asyncio.run(play()) < 0.1
+
+
+def test_stop_after_async_playback():
+    import asyncio
+
+    song = Song([Track.from_measures([rhythm.four_on_the_floor()])])
+    player = asyncio.run(song.play_async(RecordingPort(), 3000))
+    player.pause().resume().stop()
+
+    # the same player can then run on a thread
+    player = song.player(RecordingPort(), 3000)
+    asyncio.run(player.run_async())
+    player.start().join()
+    player.stop()
+    assert len(player.port.sent) == 2 * len(song.tracks[0].messages)
@@ -0,0 +1,165 @@
+import pytest
+
+from midigen import rhythm
+from midigen.sequencer import Track
+
+
+def _naive_append(t1, t2):
+    return sorted(
+        t1 + [msg.copy(time=msg.time + offset) for offset, msg in t2],
+        key=lambda m: m.time
+    )
+
+
+def test_string_tracks_matches_sequential_append():
+    measures = [
+        rhythm.four_on_the_floor(),
+        rhythm.son_clave(),
+        rhythm.straight_16ths(),
+    ]
+    track = Track.from_measures(measures)
+
+    expected = []
+    offset = 0
+    for measure in measures:
+        expected = _naive_append(
+            expected,
+            [(offset, msg) for msg in sorted(measure.messages, key=lambda m: m.time)]
+        )
+        offset += measure.duration_ticks
+
+    assert track.duration_ticks == offset
+    assert track.messages == expected
+    assert track.loop(3).duration_ticks == offset * 3
+    assert len(track.loop(3).messages) == len(expected) * 3
+
+
+def test_lazy_shift_and_stack():
+    kick = Track.from_measures([rhythm.four_on_the_floor()])
+    clave = Track.from_measures([rhythm.son_clave()])
+
+    shifted = kick.shift_time(10)
+    assert [m.time for m in shifted.messages] == [m.time + 10 for m in kick.messages]
+
+    stacked = kick.stack(clave)
+    assert stacked.duration_ticks == kick.duration_ticks
+    assert stacked.messages == sorted(
+        kick.messages + clave.messages,
+        key=lambda m: m.time
+    )
+    assert stacked.materialize().to_midi_track() == stacked.to_midi_track()
+
+
+def test_streaming_writer_matches_mido(tmp_path):
+    import io
+    from mido import MidiFile, MidiTrack, MetaMessage, bpm2tempo
+    from midigen.sequencer import Song
+
+    song = Song([
+        Track.from_measures([rhythm.son_clave(), rhythm.straight_16ths()], channel=9),
+        Track.from_measures([rhythm.four_on_the_floor()] * 3, channel=1).shift_pitch(2),
+    ])
+
+    mid = MidiFile()
+    mid.tracks.append(MidiTrack([
+        MetaMessage('track_name', name='song.mid'),
+        MetaMessage('set_tempo', tempo=bpm2tempo(120)),
+        MetaMessage('time_signature', numerator=4, denominator=4),
+    ]))
+    for track in sorted(song.tracks, key=lambda t: t.channel):
+        mid.tracks.append(track.to_midi_track())
+    expected = io.BytesIO()
+    mid.save(file=expected)
+
+    song.to_midi(str(tmp_path / 'song.mid'), tempo=120)
+    streamed = io.BytesIO()
+    song.to_midi('song.mid', tempo=120, file=streamed)
+
+    class Unseekable(io.RawIOBase):
+        def __init__(self):
+            self.data = bytearray()
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            self.data.extend(b)
+            return len(b)
+
+    unseekable = Unseekable()
+    song.to_midi('song.mid', tempo=120, file=unseekable)
+
+    assert streamed.getvalue() == expected.getvalue()
+    assert bytes(unseekable.data) == expected.getvalue()
+    assert MidiFile(str(tmp_path / 'song.mid')).tracks[1:] == mid.tracks[1:]
+
+
+def test_measure_stream_is_lazy_and_matches_from_measures():
+    import io
+    from midigen import humanize
+    from midigen.sequencer import Song
+
+    measures = [
+        humanize.swing(rhythm.straight_16ths(), 0.3)
+        for _ in range(6)
+    ]
+    pulled = []
+
+    def stream():
+        for measure in measures:
+            pulled.append(measure)
+            yield measure
+
+    track = Track.from_measure_stream(stream(), channel=2)
+    messages = track.iter_messages()
+    next(messages)
+    assert len(pulled) == 2  # one measure of lookahead
+
+    expected = Track.from_measures(measures, channel=2)
+    assert [next(messages)] + list(messages) == expected.messages[1:]
+    assert track.duration_ticks == expected.duration_ticks
+
+    streamed, eager = io.BytesIO(), io.BytesIO()
+    Song([Track.from_measure_stream(measures).shift_pitch(3)]).to_midi('s', file=streamed)
+    Song([Track.from_measures(measures).shift_pitch(3)]).to_midi('s', file=eager)
+    assert streamed.getvalue() == eager.getvalue()
+
+
+def test_measure_stream_transforms():
+    import io
+    from midigen.sequencer import Song
+
+    measures = [rhythm.son_clave(), rhythm.straight_8ths(), rhythm.four_on_the_floor()]
+    tail = Track.from_measures([rhythm.straight_16ths()])
+
+    def written(track):
+        fh = io.BytesIO()
+        Song([track]).to_midi('s', file=fh)
+        return fh.getvalue()
+
+    eager = Track.from_measures(measures).shift_time(100).shift_pitch(2)
+    streamed = Track.from_measure_stream(measures).shift_time(100).shift_pitch(2)
+    assert written(streamed) == written(eager)
+
+    eager = Track.from_measures(measures).append(tail)
+    streamed = Track.from_measure_stream(measures).append(tail)
+    assert written(streamed) == written(eager)
+    streamed = tail.append(Track.from_measure_stream(measures))
+    assert streamed.streaming
+    assert written(streamed) == written(tail.append(Track.from_measures(measures)))
+
+    columnar = Track.from_measure_stream(measures).to_columnar()
+    assert len(columnar) == len(Track.from_measures(measures).messages)
+
+    stream = Track.from_measure_stream(measures)
+    with pytest.raises(ValueError):
+        stream.shift_time(-1)
+    for build in (
+        lambda: stream.loop(2),
+        lambda: stream.stack(tail),
+        lambda: tail.stack(stream),
+        lambda: Track.string_tracks([tail, stream]),
+        lambda: Song([stream]).loop(2),
+    ):
+        with pytest.raises(TypeError, match='streaming tracks'):
+            build()
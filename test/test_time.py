@@ -5,3 +5,59 @@ def test_time_alignment():
     m1 = Measure(time_signature=TimeSignature(4, 4))
     m2 = Measure(time_signature=TimeSignature(16, 16))
     assert m2.duration_ticks == m1.duration_ticks * 4
+
+
+def test_pair_notes():
+    from mido import Message
+    from midigen.time import pair_notes
+
+    pairs, others = pair_notes([
+        Message('note_off', note=62, time=0),
+        Message('note_on', note=60, time=0),
+        Message('note_on', note=64, time=0),
+        Message('control_change', control=64, value=127, time=5),
+        Message('note_off', note=64, time=10),
+        Message('note_off', note=60, time=20),
+        Message('note_on', note=60, time=30),
+    ])
+    assert [
+        (on.note, on.time, off.time if off else None)
+        for on, off in pairs
+    ] == [(60, 0, 20), (64, 0, 10), (60, 30, None)]
+    assert [msg.type for msg in others] == ['control_change']
+
+
+def test_from_pattern_templates_are_shared_and_unchanged_by_mutators():
+    from midigen import humanize, rhythm
+
+    first, second = rhythm.son_clave(), rhythm.son_clave()
+    assert isinstance(first.messages, tuple)
+    assert first.messages is second.messages
+    assert first.note_pairs() is second.note_pairs()
+
+    before = [(m.type, m.note, m.velocity, m.time) for m in first.messages]
+    for mutator in (humanize.swing, humanize.randomize_time, humanize.randomize_velocity, humanize.pulse):
+        mutator(first, 0.5)
+    assert [(m.type, m.note, m.velocity, m.time) for m in second.messages] == before
+
+    assert rhythm.son_clave(velocity=90).messages is not first.messages
+    assert Measure.from_pattern([[60, 64]] * 4).messages == Measure.from_pattern([[60, 64]] * 4, duration=0.5).messages
+
+
+def test_template_events_are_frozen():
+    import pickle
+    import pytest
+    from midigen import rhythm
+    from midigen.events import Event
+
+    measure = rhythm.son_clave()
+    with pytest.raises(AttributeError):
+        measure.messages[0].velocity = 1
+    pairs, others = measure.note_pairs()
+    assert isinstance(pairs, tuple) and isinstance(others, tuple)
+
+    copy = measure.messages[0].copy(velocity=1)
+    assert type(copy) is Event and copy.velocity == 1
+    copy.velocity = 2
+    assert rhythm.son_clave().messages[0].velocity == 127
+    assert pickle.loads(pickle.dumps(measure.messages[0])) == measure.messages[0]